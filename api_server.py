@@ -0,0 +1,335 @@
+"""Lesende HTTP-Schnittstelle (JSON) für Alarmierung und Intranet: wer hat wann Rufbereitschaft.
+
+Der Server nutzt einen eigenen Pool lesender Verbindungen (mode=ro) und berührt die Verbindung der
+Anwendung nicht. Jede Antwort trägt ein ETag aus dem Datenstand-Zähler der Datenbank; Clients, die
+es per If-None-Match zurückschicken, erhalten bei unveränderten Daten 304 ohne Inhalt.
+
+Endpunkte (nur GET, Datumsangaben als YYYY-MM-DD):
+    /status                                     Datenstand
+    /heute                                      Rufbereitschaft heute
+    /woche[?datum=...]                          Montag bis Sonntag der Woche (Standard: aktuelle Woche)
+    /bereitschaft?von=...&bis=...[&mitarbeiter=ID]
+    /mitarbeiter                                alle Mitarbeiter
+    /mitarbeiter/ID[?von=...&bis=...]           Einträge eines Mitarbeiters (Standard: aktueller Monat)
+    /soll-ist[?von=...&bis=...]                 Soll/Ist-Punkte (Standard: aktueller Monat)
+
+Beispiele:
+    python api_server.py --port 8765
+    python api_server.py --db standort_a.db --host 0.0.0.0 --port 8765
+    RUFBEREITSCHAFT_API_PORT=8765 python main.py    # in der Anwendung mitlaufen lassen
+"""
+import argparse
+import json
+import logging
+import queue
+import sys
+import threading
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import date, timedelta
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from datenbank import Datenbank, standard_datenbank_datei
+from punkte import PunkteKalender, berechne_soll_ist
+
+logger = logging.getLogger(__name__)
+
+# Ist die Variable gesetzt, startet die Anwendung die Schnittstelle auf diesem Port (nur localhost)
+API_PORT_UMGEBUNGSVARIABLE = "RUFBEREITSCHAFT_API_PORT"
+STANDARD_PORT = 8765
+MAX_TAGE = 3 * 366  # größter abfragbarer Zeitraum
+
+
+class AnfrageFehler(Exception):
+    def __init__(self, status, meldung):
+        super().__init__(meldung)
+        self.status = status
+
+
+def datum_parameter(parameter, name, standard):
+    wert = parameter.get(name)
+    if wert is None:
+        return standard
+    try:
+        return date.fromisoformat(wert)
+    except ValueError:
+        raise AnfrageFehler(HTTPStatus.BAD_REQUEST, f"{name}: ungültiges Datum '{wert}' (YYYY-MM-DD)")
+
+
+def zahl_parameter(wert, name):
+    try:
+        return int(wert)
+    except (TypeError, ValueError):
+        raise AnfrageFehler(HTTPStatus.BAD_REQUEST, f"{name}: ganze Zahl erwartet, nicht '{wert}'")
+
+
+def zeitraum_parameter(parameter, von, bis):
+    von = datum_parameter(parameter, "von", von)
+    bis = datum_parameter(parameter, "bis", bis)
+    if von > bis:
+        raise AnfrageFehler(HTTPStatus.BAD_REQUEST, "von liegt nach bis")
+    if (bis - von).days >= MAX_TAGE:
+        raise AnfrageFehler(HTTPStatus.BAD_REQUEST, f"Zeitraum länger als {MAX_TAGE} Tage")
+    return von, bis
+
+
+def aktueller_monat(heute):
+    start = heute.replace(day=1)
+    ende = (start.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+    return start, ende
+
+
+class VerbindungsPool:
+    # Feste Anzahl lesender Verbindungen; jede wird immer nur von einem Anfrage-Thread benutzt.
+    # Eine Anfrage liest in einer Lesetransaktion, sieht also einen einheitlichen Datenstand.
+    def __init__(self, datei, groesse=4, wartezeit=5.0):
+        self.wartezeit = wartezeit
+        self._alle = []
+        try:
+            for _ in range(groesse):
+                self._alle.append(Datenbank(datei=datei, nur_lesen=True))
+        except Exception:
+            self.schliesse()
+            raise
+        self._frei = queue.LifoQueue()
+        for db in self._alle:
+            self._frei.put(db)
+
+    @contextmanager
+    def verbindung(self):
+        try:
+            db = self._frei.get(timeout=self.wartezeit)
+        except queue.Empty:
+            raise AnfrageFehler(HTTPStatus.SERVICE_UNAVAILABLE, "Alle Datenbankverbindungen sind belegt")
+        try:
+            db.conn.execute("BEGIN")
+            yield db
+        finally:
+            db.conn.rollback()
+            self._frei.put(db)
+
+    def schliesse(self):
+        for db in self._alle:
+            db.schliesse_verbindung()
+
+
+class AntwortCache:
+    # Fertig serialisierte Antworten je (Abfrage, Argumente); gültig, solange der Datenstand gleich ist
+    def __init__(self, groesse=256):
+        self.groesse = groesse
+        self._eintraege = OrderedDict()  # schluessel -> (datenstand, etag, inhalt)
+        self._sperre = threading.Lock()
+
+    def hole(self, schluessel, datenstand):
+        with self._sperre:
+            eintrag = self._eintraege.get(schluessel)
+            if eintrag is None or eintrag[0] != datenstand:
+                return None
+            self._eintraege.move_to_end(schluessel)
+            return eintrag[1], eintrag[2]
+
+    def lege_ab(self, schluessel, datenstand, etag, inhalt):
+        with self._sperre:
+            self._eintraege[schluessel] = (datenstand, etag, inhalt)
+            self._eintraege.move_to_end(schluessel)
+            while len(self._eintraege) > self.groesse:
+                self._eintraege.popitem(last=False)
+
+
+class ApiAnfrage(BaseHTTPRequestHandler):
+    server_version = "Rufbereitschaft-API/1.0"
+    protocol_version = "HTTP/1.1"  # Keep-Alive für pollende Clients
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        parameter = {name: werte[-1] for name, werte in parse_qs(url.query).items()}
+        try:
+            etag, inhalt = self.server.beantworte(url.path, parameter)
+        except AnfrageFehler as fehler:
+            self.sende(fehler.status, json.dumps({"fehler": str(fehler)}, ensure_ascii=False).encode())
+            return
+        except Exception:
+            logger.exception("Fehler bei Anfrage %s", self.path)
+            self.sende(HTTPStatus.INTERNAL_SERVER_ERROR, b'{"fehler": "Interner Fehler"}')
+            return
+
+        angefragt = {wert.strip() for wert in self.headers.get("If-None-Match", "").split(",")}
+        if etag in angefragt or "*" in angefragt:
+            self.sende(HTTPStatus.NOT_MODIFIED, None, etag)
+        else:
+            self.sende(HTTPStatus.OK, inhalt, etag)
+
+    def sende(self, status, inhalt, etag=None):
+        self.send_response(status)
+        if etag is not None:
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+        if inhalt is None:
+            self.send_header("Content-Length", "0")
+        else:
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(inhalt)))
+        self.end_headers()
+        if inhalt is not None:
+            self.wfile.write(inhalt)
+
+    def log_message(self, format, *args):
+        logger.debug("%s %s", self.address_string(), format % args)
+
+
+class ApiServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, datei, host="127.0.0.1", port=STANDARD_PORT, verbindungen=4, punkte_kalender=None):
+        self.cache = AntwortCache()
+        self.punkte_kalender = punkte_kalender or PunkteKalender.fuer_land()
+        self._thread = None
+        # Zuerst binden: ist der Port belegt, wurden noch keine Verbindungen geöffnet
+        super().__init__((host, port), ApiAnfrage)
+        try:
+            self.pool = VerbindungsPool(datei, verbindungen)
+        except Exception:
+            self.server_close()
+            raise
+
+    @property
+    def adresse(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def starte_im_hintergrund(self):
+        self._thread = threading.Thread(target=self.serve_forever, name="api-server", daemon=True)
+        self._thread.start()
+        logger.info("HTTP-Schnittstelle läuft auf %s", self.adresse)
+
+    def beende(self):
+        if self._thread is not None:
+            self.shutdown()
+            self._thread.join()
+            self._thread = None
+        self.server_close()
+        self.pool.schliesse()
+
+    def beantworte(self, pfad, parameter):
+        # Liefert (etag, inhalt). Das ETag hängt an Datenstand und aufgelösten Argumenten,
+        # damit z.B. /heute nach Mitternacht nicht mehr als unverändert gilt.
+        abfrage, argumente = self.loese_auf(pfad, parameter)
+        schluessel = (abfrage.__name__, argumente)
+        with self.pool.verbindung() as db:
+            datenstand = db.lade_datenstand()
+            treffer = self.cache.hole(schluessel, datenstand)
+            if treffer is not None:
+                return treffer
+            daten = abfrage(db, *argumente)
+        daten["datenstand"] = datenstand
+        etag = f'"{datenstand}-{zlib.crc32(repr(schluessel).encode()):08x}"'
+        inhalt = json.dumps(daten, ensure_ascii=False).encode()
+        self.cache.lege_ab(schluessel, datenstand, etag, inhalt)
+        return etag, inhalt
+
+    def loese_auf(self, pfad, parameter):
+        teile = [teil for teil in pfad.split("/") if teil]
+        heute = date.today()
+        if teile == ["status"]:
+            return self.status, ()
+        if teile == ["heute"]:
+            return self.bereitschaft, (heute, heute, None)
+        if teile == ["woche"]:
+            tag = datum_parameter(parameter, "datum", heute)
+            montag = tag - timedelta(days=tag.weekday())
+            return self.bereitschaft, (montag, montag + timedelta(days=6), None)
+        if teile == ["bereitschaft"]:
+            von, bis = zeitraum_parameter(parameter, heute, heute)
+            mitarbeiter_id = parameter.get("mitarbeiter")
+            if mitarbeiter_id is not None:
+                mitarbeiter_id = zahl_parameter(mitarbeiter_id, "mitarbeiter")
+            return self.bereitschaft, (von, bis, mitarbeiter_id)
+        if teile == ["mitarbeiter"]:
+            return self.mitarbeiter, ()
+        if len(teile) == 2 and teile[0] == "mitarbeiter":
+            von, bis = zeitraum_parameter(parameter, *aktueller_monat(heute))
+            return self.bereitschaft, (von, bis, zahl_parameter(teile[1], "Mitarbeiter-ID"))
+        if teile == ["soll-ist"]:
+            return self.soll_ist, zeitraum_parameter(parameter, *aktueller_monat(heute))
+        raise AnfrageFehler(HTTPStatus.NOT_FOUND, f"Unbekannter Pfad '{pfad}'")
+
+    def status(self, db):
+        return {"schema": db.schema_version()}
+
+    def mitarbeiter(self, db):
+        return {"mitarbeiter": [
+            {
+                "mitarbeiter_id": mitarbeiter.mitarbeiter_id,
+                "vorname": mitarbeiter.vorname,
+                "nachname": mitarbeiter.nachname,
+                "eintritt": mitarbeiter.eintritt.isoformat() if mitarbeiter.eintritt else None,
+                "farbe": mitarbeiter.farbe,
+            }
+            for mitarbeiter in db.lade_mitarbeiter()
+        ]}
+
+    def bereitschaft(self, db, von, bis, mitarbeiter_id):
+        # Alle Tage des Zeitraums, auch unbesetzte (leere Liste), damit Lücken sichtbar sind
+        if mitarbeiter_id is not None and not db.conn.execute(
+                "SELECT 1 FROM mitarbeiter WHERE mitarbeiter_id = ?", (mitarbeiter_id,)).fetchone():
+            raise AnfrageFehler(HTTPStatus.NOT_FOUND, f"Mitarbeiter {mitarbeiter_id} nicht gefunden")
+        tage = {}
+        for eintrag in db.iteriere_kalender_eintraege(von, bis, mitarbeiter_id):
+            tage.setdefault(eintrag.datum, []).append(
+                {"mitarbeiter_id": eintrag.mitarbeiter_id, "name": eintrag.name})
+        return {
+            "von": von.isoformat(),
+            "bis": bis.isoformat(),
+            "tage": [
+                {"datum": tag.isoformat(), "bereitschaft": tage.get(tag, [])}
+                for tag in (von + timedelta(days=i) for i in range((bis - von).days + 1))
+            ],
+        }
+
+    def soll_ist(self, db, von, bis):
+        return {
+            "von": von.isoformat(),
+            "bis": bis.isoformat(),
+            "zeilen": [
+                {
+                    "mitarbeiter_id": zeile.mitarbeiter_id,
+                    "vorname": zeile.vorname,
+                    "nachname": zeile.nachname,
+                    "soll": zeile.soll,
+                    "ist": zeile.ist,
+                    "differenz": zeile.differenz,
+                }
+                for zeile in berechne_soll_ist(db, von, bis, self.punkte_kalender)
+            ],
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Lesende HTTP-Schnittstelle der Rufbereitschaft")
+    parser.add_argument("--db", help="Datenbankdatei (Standard: Datenbank im Nutzerordner)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=STANDARD_PORT)
+    parser.add_argument("--verbindungen", type=int, default=4, help="Größe des Verbindungspools")
+    argumente = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)-8s %(name)s: %(message)s")
+
+    datei = argumente.db or str(standard_datenbank_datei())
+    # Einmal schreibend öffnen, damit das Schema aktuell ist; danach nur noch lesende Verbindungen
+    Datenbank(datei=datei).schliesse_verbindung()
+
+    server = ApiServer(datei, argumente.host, argumente.port, argumente.verbindungen)
+    logger.info("HTTP-Schnittstelle läuft auf %s", server.adresse)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.beende()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
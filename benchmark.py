@@ -0,0 +1,235 @@
+"""Benchmark der wichtigsten Lese- und Aktualisierungspfade gegen eine synthetische Datenbank.
+
+Läuft ohne Bildschirm (Qt-Plattform 'offscreen') und ohne Netzwerk. Die Ergebnisse werden als
+JSON geschrieben und können mit --vergleich gegen einen früheren Lauf geprüft werden.
+
+Beispiele:
+    python benchmark.py --mitarbeiter 200 --jahre 10 --ausgabe basis.json
+    python benchmark.py --mitarbeiter 200 --jahre 10 --vergleich basis.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from datenbank import Datenbank
+from feiertagsAPI import FeiertageAPI
+from punkte import PunkteKalender, berechne_soll_ist
+
+
+def erzeuge_testdatenbank(datei, mitarbeiter=50, jahre=5, pro_tag=(1, 2), seed=42, ueberschreiben=False):
+    # Füllt eine neue Datenbank mit Mitarbeitern und 'jahre' Jahren Rufbereitschaft bis heute.
+    # Eine vorhandene Datei wird nur mit ueberschreiben=True ersetzt (samt -wal/-shm).
+    if Path(datei).exists() and not ueberschreiben:
+        raise FileExistsError(f"{datei} existiert bereits")
+    for endung in ("", "-wal", "-shm", "-journal"):
+        Path(f"{datei}{endung}").unlink(missing_ok=True)
+    random.seed(seed)
+    db = Datenbank(datei=str(datei))
+
+    ende = date.today()
+    start = date(ende.year - jahre + 1, 1, 1)
+    farben = ["#%06x" % random.randint(0, 0xFFFFFF) for _ in range(mitarbeiter)]
+
+    with db.transaktion():
+        ids = []
+        for i in range(mitarbeiter):
+            eintritt = start + timedelta(days=random.randint(0, max((ende - start).days // 2, 0)))
+            ids.append(db.fuege_mitarbeiter_hinzu(f"Vorname{i}", f"Nachname{i}", eintritt, farben[i]))
+
+        eintraege = []
+        tag = start
+        while tag <= ende:
+            for mitarbeiter_id in random.sample(ids, min(random.randint(*pro_tag), len(ids))):
+                eintraege.append((tag, mitarbeiter_id))
+            tag += timedelta(days=1)
+        db.fuege_kalender_eintraege_hinzu(eintraege)
+
+    return db
+
+
+@contextmanager
+def ohne_netzwerk():
+    # Feiertage ausschließlich lokal berechnen; ein API-Zugriff wäre ein Fehler im Benchmark
+    original = FeiertageAPI.lade_feiertage_von_api
+
+    def gesperrt(cls, jahr, land=FeiertageAPI.LAND_NRW):
+        raise RuntimeError(f"Benchmark: kein Netzwerkzugriff (Feiertage {jahr}/{land})")
+
+    FeiertageAPI.lade_feiertage_von_api = classmethod(gesperrt)
+    try:
+        yield
+    finally:
+        FeiertageAPI.lade_feiertage_von_api = original
+
+
+def miss(funktion, wiederholungen):
+    zeiten = []
+    for _ in range(wiederholungen):
+        t0 = time.perf_counter()
+        funktion()
+        zeiten.append(time.perf_counter() - t0)
+    return {
+        "min": min(zeiten),
+        "median": statistics.median(zeiten),
+        "mittel": statistics.fmean(zeiten),
+        "wiederholungen": wiederholungen,
+    }
+
+
+def fuehre_benchmarks_aus(db, wiederholungen):
+    from PyQt5.QtCore import QDate
+    from PyQt5.QtWidgets import QApplication
+
+    from kalender import KalenderWidget
+    from mitarbeiter import MitarbeiterWidget
+    from sollistwidget import SollIstWidget
+
+    app = QApplication.instance() or QApplication([])
+
+    erster_tag, letzter_tag = db.conn.execute(
+        "SELECT MIN(datum), MAX(datum) FROM kalender_mitarbeiter"
+    ).fetchone()
+    start = date.fromisoformat(erster_tag)
+    ende = date.fromisoformat(letzter_tag)
+    monat_start = ende.replace(day=1)
+
+    def kalt(funktion):
+        # Ohne Caches: Feiertage/Punkte werden bei jedem Lauf neu aufgebaut
+        def ausfuehren():
+            FeiertageAPI.setze_datenbank(db)
+            PunkteKalender.fuer_land().invalidiere()
+            funktion()
+        return ausfuehren
+
+    # Tagespunkte vorab schreiben, sonst misst die Ist-Abfrage einen Join gegen eine leere Tabelle
+    PunkteKalender.fuer_land().sichere_tagespunkte(db, start, ende)
+
+    ergebnisse = {}
+    ergebnisse["db.lade_mitarbeiter"] = miss(db.lade_mitarbeiter, wiederholungen)
+    ergebnisse["db.lade_kalender_eintraege"] = miss(
+        lambda: db.lade_kalender_eintraege(ende), wiederholungen)
+    ergebnisse["db.lade_kalender_eintraege_im_zeitraum(monat)"] = miss(
+        lambda: db.lade_kalender_eintraege_im_zeitraum(monat_start, ende), wiederholungen)
+    ergebnisse["db.lade_ist_punkte_je_mitarbeiter(gesamt)"] = miss(
+        lambda: db.lade_ist_punkte_je_mitarbeiter(start, ende), wiederholungen)
+    ergebnisse["berechne_soll_ist(gesamt, kalt)"] = miss(
+        kalt(lambda: berechne_soll_ist(db, start, ende)), wiederholungen)
+    ergebnisse["berechne_soll_ist(gesamt, warm)"] = miss(
+        lambda: berechne_soll_ist(db, start, ende), wiederholungen)
+
+    kalender = KalenderWidget(db)
+    ergebnisse["KalenderWidget.__init__"] = miss(lambda: KalenderWidget(db), wiederholungen)
+    ergebnisse["KalenderWidget.lade_eintraege_neu"] = miss(kalender.lade_eintraege_neu, wiederholungen)
+    ergebnisse["KalenderWidget.aktualisiere_alle_farbungen"] = miss(
+        kalender.aktualisiere_alle_farbungen, wiederholungen)
+
+    mitarbeiter = MitarbeiterWidget(db)
+    daten = db.lade_mitarbeiter()
+    ergebnisse["MitarbeiterWidget.aktualisiere_tabelle"] = miss(
+        lambda: mitarbeiter.aktualisiere_tabelle(daten), wiederholungen)
+
+    soll_ist = SollIstWidget(db)
+    soll_ist.start_datum.setDate(QDate(start.year, start.month, start.day))
+    soll_ist.end_datum.setDate(QDate(ende.year, ende.month, ende.day))
+
+    def lade_und_warte():
+        # Die Berechnung läuft im Thread-Pool; gemessen wird bis zur fertigen Tabelle
+        soll_ist.lade_und_zeige_daten()
+        while soll_ist.laeuft():
+            app.processEvents()
+            time.sleep(0.0005)
+
+    ergebnisse["SollIstWidget.lade_und_zeige_daten(gesamt)"] = miss(lade_und_warte, wiederholungen)
+    zeilen = berechne_soll_ist(db, start, ende)
+    ergebnisse["SollIstWidget.zeige_daten(gesamt)"] = miss(lambda: soll_ist.zeige_daten(zeilen), wiederholungen)
+
+    app.processEvents()
+    return ergebnisse
+
+
+def vergleiche(ergebnisse, basis, toleranz):
+    # Gibt die Namen aller Messungen zurück, deren Median um mehr als 'toleranz' schlechter ist
+    regressionen = []
+    print(f"{'Messung':<55} {'Basis':>10} {'Aktuell':>10} {'Faktor':>7}")
+    for name, werte in ergebnisse.items():
+        alt = basis.get("ergebnisse", {}).get(name)
+        if alt is None:
+            print(f"{name:<55} {'-':>10} {werte['median'] * 1000:>8.2f}ms {'neu':>7}")
+            continue
+        faktor = werte["median"] / alt["median"] if alt["median"] else float("inf")
+        markierung = "  <-- Regression" if faktor > toleranz else ""
+        print(f"{name:<55} {alt['median'] * 1000:>8.2f}ms {werte['median'] * 1000:>8.2f}ms {faktor:>6.2f}x{markierung}")
+        if faktor > toleranz:
+            regressionen.append(name)
+    return regressionen
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark der Rufbereitschaft-Datenpfade")
+    parser.add_argument("--mitarbeiter", type=int, default=50)
+    parser.add_argument("--jahre", type=int, default=5)
+    parser.add_argument("--wiederholungen", type=int, default=5)
+    parser.add_argument("--db", help="Pfad der Testdatenbank (Standard: temporäre Datei)")
+    parser.add_argument("--ueberschreiben", action="store_true",
+                        help="Vorhandene Datei unter --db ersetzen (wird gelöscht!)")
+    parser.add_argument("--ausgabe", help="Ergebnisse als JSON in diese Datei schreiben")
+    parser.add_argument("--vergleich", help="Früheres JSON-Ergebnis zum Vergleich")
+    parser.add_argument("--toleranz", type=float, default=1.25,
+                        help="Faktor, ab dem ein langsamerer Median als Regression gilt")
+    argumente = parser.parse_args(argv)
+    if argumente.db and Path(argumente.db).exists() and not argumente.ueberschreiben:
+        parser.error(f"{argumente.db} existiert bereits; zum Ersetzen --ueberschreiben angeben")
+
+    with tempfile.TemporaryDirectory() as temp_ordner:
+        datei = argumente.db or os.path.join(temp_ordner, "benchmark.db")
+        with ohne_netzwerk():
+            t0 = time.perf_counter()
+            db = erzeuge_testdatenbank(datei, argumente.mitarbeiter, argumente.jahre,
+                                       ueberschreiben=argumente.ueberschreiben)
+            erzeugung = time.perf_counter() - t0
+            FeiertageAPI.setze_datenbank(db)
+            anzahl = db.conn.execute("SELECT COUNT(*) FROM kalender_mitarbeiter").fetchone()[0]
+            ergebnisse = fuehre_benchmarks_aus(db, argumente.wiederholungen)
+            db.schliesse_verbindung()
+
+    resultat = {
+        "meta": {
+            "zeitpunkt": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "plattform": platform.platform(),
+            "mitarbeiter": argumente.mitarbeiter,
+            "jahre": argumente.jahre,
+            "kalender_eintraege": anzahl,
+            "erzeugung_s": erzeugung,
+        },
+        "ergebnisse": ergebnisse,
+    }
+
+    if argumente.ausgabe:
+        with open(argumente.ausgabe, "w", encoding="utf-8") as datei_ausgabe:
+            json.dump(resultat, datei_ausgabe, indent=2, ensure_ascii=False)
+
+    if argumente.vergleich:
+        with open(argumente.vergleich, encoding="utf-8") as datei_basis:
+            basis = json.load(datei_basis)
+        return 1 if vergleiche(ergebnisse, basis, argumente.toleranz) else 0
+
+    if not argumente.ausgabe:
+        json.dump(resultat, sys.stdout, indent=2, ensure_ascii=False)
+        sys.stdout.write("\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
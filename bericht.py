@@ -0,0 +1,144 @@
+"""Soll/Ist-Bericht ohne GUI, z.B. für den Monatsabschluss per Cronjob.
+
+Beispiele:
+    python bericht.py                                   # Vormonat, Datenbank im Nutzerordner
+    python bericht.py --monat 2025-07 --format csv
+    python bericht.py --von 2025-01-01 --bis 2025-06-30 --db standort_a.db --db standort_b.db
+    python bericht.py --summen-neu-aufbauen --db standort_a.db   # Monatssummen reparieren
+
+Der Bericht öffnet die Datenbanken nur lesend; Dateien mit älterem Schema zuerst mit der Anwendung öffnen.
+"""
+import argparse
+import csv
+import json
+import sqlite3
+import sys
+from datetime import date, timedelta
+from pathlib import Path
+
+from datenbank import Datenbank, standard_datenbank_datei
+from punkte import PunkteKalender, berechne_soll_ist
+
+
+def monatsgrenzen(monat_str):
+    jahr, monat = map(int, monat_str.split("-"))
+    start = date(jahr, monat, 1)
+    ende = (start.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+    return start, ende
+
+
+def vormonat(heute=None):
+    heute = heute or date.today()
+    ende = heute.replace(day=1) - timedelta(days=1)
+    return ende.replace(day=1), ende
+
+
+def parse_argumente(argv=None):
+    parser = argparse.ArgumentParser(description="Soll/Ist-Punkte der Rufbereitschaft berechnen")
+    parser.add_argument("--db", action="append", dest="datenbanken", metavar="DATEI",
+                        help="Datenbankdatei (mehrfach angeben für mehrere Standorte)")
+    parser.add_argument("--monat", help="Berichtsmonat im Format YYYY-MM")
+    parser.add_argument("--von", type=date.fromisoformat, help="Startdatum YYYY-MM-DD")
+    parser.add_argument("--bis", type=date.fromisoformat, help="Enddatum YYYY-MM-DD")
+    parser.add_argument("--format", choices=["text", "csv", "json"], default="text")
+    parser.add_argument("--ausgabe", help="Ausgabedatei (Standard: stdout)")
+    parser.add_argument("--summen-neu-aufbauen", action="store_true",
+                        help="Monatssummen (punkte_monat) aus den Rohdaten neu berechnen und beenden")
+    argumente = parser.parse_args(argv)
+
+    if argumente.monat:
+        argumente.von, argumente.bis = monatsgrenzen(argumente.monat)
+    elif argumente.von is None and argumente.bis is None:
+        argumente.von, argumente.bis = vormonat()
+    elif argumente.von is None or argumente.bis is None:
+        parser.error("--von und --bis müssen gemeinsam angegeben werden")
+    if argumente.von > argumente.bis:
+        parser.error("--von liegt nach --bis")
+
+    if not argumente.datenbanken:
+        argumente.datenbanken = [str(standard_datenbank_datei())]
+    # Ein Tippfehler darf keine neue, leere Datenbank anlegen
+    for datei in argumente.datenbanken:
+        if not Path(datei).is_file():
+            parser.error(f"Datenbankdatei nicht gefunden: {datei}")
+    return argumente
+
+
+def baue_summen_neu(datenbanken):
+    for datei in datenbanken:
+        db = Datenbank(datei=datei)
+        try:
+            db.baue_punkte_monat_neu()
+        finally:
+            db.schliesse_verbindung()
+
+
+def erstelle_bericht(datenbanken, von, bis):
+    # Liefert je Standort (Dateiname ohne Endung) die Soll/Ist-Zeilen. Der Bericht liest nur:
+    # keine Migration, keine Sicherungskopien, Feiertage werden im Speicher berechnet.
+    bericht = []
+    for datei in datenbanken:
+        db = Datenbank(datei=datei, nur_lesen=True)
+        try:
+            zeilen = berechne_soll_ist(db, von, bis, PunkteKalender.fuer_land())
+        finally:
+            db.schliesse_verbindung()
+        bericht.append((Path(datei).stem, zeilen))
+    return bericht
+
+
+def schreibe_bericht(bericht, von, bis, format, ausgabe):
+    felder = ["standort", "mitarbeiter_id", "vorname", "nachname", "soll", "ist", "differenz"]
+    datensaetze = [
+        {
+            "standort": standort,
+            "mitarbeiter_id": zeile.mitarbeiter_id,
+            "vorname": zeile.vorname,
+            "nachname": zeile.nachname,
+            "soll": zeile.soll,
+            "ist": zeile.ist,
+            "differenz": zeile.differenz,
+        }
+        for standort, zeilen in bericht
+        for zeile in zeilen
+    ]
+
+    if format == "json":
+        json.dump({"von": von.isoformat(), "bis": bis.isoformat(), "zeilen": datensaetze},
+                  ausgabe, ensure_ascii=False, indent=2)
+        ausgabe.write("\n")
+    elif format == "csv":
+        writer = csv.DictWriter(ausgabe, fieldnames=felder, delimiter=";")
+        writer.writeheader()
+        writer.writerows(datensaetze)
+    else:
+        ausgabe.write(f"Soll/Ist vom {von:%d.%m.%Y} bis {bis:%d.%m.%Y}\n")
+        for standort, zeilen in bericht:
+            ausgabe.write(f"\n[{standort}]\n")
+            ausgabe.write(f"{'ID':>5}  {'Name':<30} {'Soll':>6} {'Ist':>6} {'Diff':>6}\n")
+            for zeile in zeilen:
+                name = f"{zeile.vorname} {zeile.nachname}"
+                ausgabe.write(f"{zeile.mitarbeiter_id:>5}  {name:<30} {zeile.soll:>6} {zeile.ist:>6} {zeile.differenz:>6}\n")
+
+
+def main(argv=None):
+    argumente = parse_argumente(argv)
+    if argumente.summen_neu_aufbauen:
+        baue_summen_neu(argumente.datenbanken)
+        return 0
+    try:
+        bericht = erstelle_bericht(argumente.datenbanken, argumente.von, argumente.bis)
+    except sqlite3.Error as e:
+        print(f"Fehler: {e}", file=sys.stderr)
+        return 1
+
+    if argumente.ausgabe:
+        with open(argumente.ausgabe, "w", encoding="utf-8", newline="") as ausgabe:
+            schreibe_bericht(bericht, argumente.von, argumente.bis, argumente.format, ausgabe)
+    else:
+        schreibe_bericht(bericht, argumente.von, argumente.bis, argumente.format, sys.stdout)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
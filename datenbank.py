@@ -1,29 +1,318 @@
+import functools
+import logging
+import random
 import sqlite3
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from itertools import starmap
+from pathlib import Path
 from sqlite3 import Error
 
+from datensaetze import KalenderEintrag, Mitarbeiter
+from ereignisse import (
+    EintraegeEntfernt, EintraegeGeaendert, EintraegeHinzugefuegt, EreignisBus,
+    MitarbeiterGeaendert, MitarbeiterGeloescht, MitarbeiterHinzugefuegt,
+)
+from messung import messe_methoden
+from startprofil import StartProfil
+
+logger = logging.getLogger(__name__)
+
+APP_NAME = "Rufbereitschaft"
+APP_AUTHOR = "GahlenDevelopment"  # optional, unter Windows wird das als Unterordner genutzt
+DATENBANK_DATEINAME = "rufbereitschaft.db"
+
+
+def daten_ordner():
+    # Benutzer-spezifischen Datenordner bestimmen
+    from platformdirs import user_data_dir
+
+    ordner = Path(user_data_dir(APP_NAME, APP_AUTHOR))
+    ordner.mkdir(parents=True, exist_ok=True)
+    return ordner
+
+
+def standard_datenbank_datei():
+    return daten_ordner() / DATENBANK_DATEINAME
+
+
+# Datumsvertrag: Tage werden als ISO-Text 'YYYY-MM-DD' gespeichert (sortier- und vergleichbar in SQL).
+# Spalten vom Typ 'DATE TEXT' kommen als datetime.date zurück (das erste Wort wählt den Konverter,
+# 'TEXT' erhält die Text-Affinität, damit Joins mit tagespunkte/feiertage Indizes nutzen können).
+# date-Parameter werden als ISO-Text gebunden.
+sqlite3.register_adapter(date, date.isoformat)
+sqlite3.register_adapter(datetime, lambda wert: wert.date().isoformat())
+sqlite3.register_converter("DATE", lambda wert: date.fromisoformat(wert.decode()))
+
+
+def als_datum(wert):
+    # Gegenstück zu den Adaptern für Ereignisse: Aufrufer dürfen auch ISO-Text oder datetime übergeben,
+    # Abonnenten erhalten immer datetime.date
+    if isinstance(wert, datetime):
+        return wert.date()
+    if isinstance(wert, str):
+        return date.fromisoformat(wert)
+    return wert
+
+
+class KonfliktFehler(Exception):
+    # Der Datensatz wurde seit dem Laden von einer anderen Sitzung geändert oder gelöscht
+    pass
+
+
+def ist_sperrfehler(fehler):
+    # SQLITE_BUSY / SQLITE_LOCKED (auch erweiterte Codes wie SQLITE_BUSY_SNAPSHOT)
+    code = getattr(fehler, 'sqlite_errorcode', None)
+    if code is not None:
+        return code & 0xff in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+    meldung = str(fehler).lower()
+    return 'locked' in meldung or 'busy' in meldung
+
+
+def mit_wiederholung(methode):
+    # Schreiboperation bei gesperrter Datenbank mit exponentiellem Backoff (plus Zufallsanteil,
+    # damit konkurrierende Prozesse nicht im Gleichtakt wiederholen) erneut ausführen. Innerhalb
+    # einer äußeren Transaktion wird nicht wiederholt, dort entscheidet der Aufrufer.
+    @functools.wraps(methode)
+    def wrapper(self, *args, **kwargs):
+        if self._transaktionstiefe:
+            return methode(self, *args, **kwargs)
+        for versuch in range(self.SCHREIB_VERSUCHE):
+            try:
+                return methode(self, *args, **kwargs)
+            except sqlite3.OperationalError as fehler:
+                if not ist_sperrfehler(fehler) or versuch == self.SCHREIB_VERSUCHE - 1:
+                    raise
+                self.conn.rollback()
+                wartezeit = self.BACKOFF_SEKUNDEN * 2 ** versuch * random.uniform(0.5, 1.5)
+                logger.warning("%s: Datenbank gesperrt (%s), neuer Versuch in %.2f s",
+                               methode.__name__, fehler, wartezeit)
+                time.sleep(wartezeit)
+    return wrapper
+
+
+def tageskategorie_sql(datum):
+    # 3 = Feiertag (NRW), 2 = Wochenende, 1 = Werktag; entspricht zugleich den Standardpunkten
+    return f"""(CASE
+        WHEN EXISTS (SELECT 1 FROM feiertage f WHERE f.land = 'NW' AND f.datum = {datum}) THEN 3
+        WHEN strftime('%w', {datum}) IN ('0', '6') THEN 2
+        ELSE 1
+    END)"""
+
+
+def punkte_monat_aenderung_sql(zeile, vorzeichen):
+    # Addiert (vorzeichen 1) bzw. subtrahiert (-1) einen Kalendereintrag in der Monatssumme
+    return f"""
+    INSERT INTO punkte_monat (mitarbeiter_id, monat, ist_punkte, werktage, wochenendtage, feiertage)
+    SELECT {zeile}.mitarbeiter_id,
+           substr({zeile}.datum, 1, 7),
+           {vorzeichen} * COALESCE((SELECT punkte FROM tagespunkte WHERE datum = {zeile}.datum), kat),
+           {vorzeichen} * (kat = 1),
+           {vorzeichen} * (kat = 2),
+           {vorzeichen} * (kat = 3)
+    FROM (SELECT {tageskategorie_sql(zeile + '.datum')} AS kat)
+    WHERE 1
+    ON CONFLICT (mitarbeiter_id, monat) DO UPDATE SET
+        ist_punkte = ist_punkte + excluded.ist_punkte,
+        werktage = werktage + excluded.werktage,
+        wochenendtage = wochenendtage + excluded.wochenendtage,
+        feiertage = feiertage + excluded.feiertage;
+    """
+
+
+def leere_punkte_monat_sql(zeile):
+    return f"""
+    DELETE FROM punkte_monat
+    WHERE mitarbeiter_id = {zeile}.mitarbeiter_id AND monat = substr({zeile}.datum, 1, 7)
+      AND werktage = 0 AND wochenendtage = 0 AND feiertage = 0;
+    """
+
+
+# Bei eingeschalteter Messung wird jede öffentliche Methode (Abfrage/Schreiboperation) gemessen
+@messe_methoden(ausnahmen=("transaktion",))
 class Datenbank:
-    def __init__(self, datei='datenbank/rufbereitschaft.sqlite'):
+    # Schema-Migrationen in Reihenfolge; Index + 1 entspricht PRAGMA user_version nach der Migration
+    MIGRATIONEN = [
+        'erstelle_tabellen',
+        'migration_indizes_und_eindeutigkeit',
+        'migration_punkte_monat',
+        'migration_datumsspalten',
+        'migration_zeilenversion',
+        'migration_datenstand',
+    ]
+
+    # Vorbereitete Anweisungen je Verbindung; alle SQL-Texte sind Konstanten und treffen den Cache
+    STATEMENT_CACHE = 256
+
+    # Mehrbenutzerbetrieb: so lange wartet SQLite selbst auf eine Sperre, danach wiederholt
+    # mit_wiederholung die ganze Schreiboperation bis zu SCHREIB_VERSUCHE mal
+    BUSY_TIMEOUT_SEKUNDEN = 5.0
+    SCHREIB_VERSUCHE = 5
+    BACKOFF_SEKUNDEN = 0.05
+
+    SQL_MITARBEITER = """
+    SELECT mitarbeiter_id, mitarbeiter_vorname, mitarbeiter_nachname, mitarbeiter_eintritt, mitarbeiter_farbe, version
+    FROM mitarbeiter
+    """
+    SQL_KALENDER_EINTRAEGE = """
+    SELECT k.id, k.datum, k.mitarbeiter_id, m.mitarbeiter_vorname || ' ' || m.mitarbeiter_nachname, k.version
+    FROM kalender_mitarbeiter k
+    JOIN mitarbeiter m ON k.mitarbeiter_id = m.mitarbeiter_id
+    WHERE k.datum BETWEEN ? AND ?
+    ORDER BY k.datum, k.id
+    """
+    SQL_KALENDER_EINTRAEGE_MITARBEITER = """
+    SELECT k.id, k.datum, k.mitarbeiter_id, m.mitarbeiter_vorname || ' ' || m.mitarbeiter_nachname, k.version
+    FROM kalender_mitarbeiter k
+    JOIN mitarbeiter m ON k.mitarbeiter_id = m.mitarbeiter_id
+    WHERE k.mitarbeiter_id = ? AND k.datum BETWEEN ? AND ?
+    ORDER BY k.datum, k.id
+    """
+
+    # Tabellen, deren Änderungen den Datenstand (ETag der HTTP-Schnittstelle) erhöhen
+    DATENSTAND_TABELLEN = ['mitarbeiter', 'kalender_mitarbeiter', 'feiertage']
+
+    def __init__(self, datei='datenbank/rufbereitschaft.sqlite', nur_lesen=False):
+        # nur_lesen: Verbindung mit mode=ro ohne Migration, darf auch in einem anderen Thread
+        # als dem erzeugenden benutzt werden (immer nur von einem Thread gleichzeitig, siehe api_server.py)
         self.datei = datei
+        self.nur_lesen = nur_lesen
         self.conn = None
-        self.cursor = None
-        self.verbinde()
-        self.erstelle_tabellen()
+        self._transaktionstiefe = 0
+        # Änderungsereignisse; innerhalb einer Transaktion erst nach dem Commit zugestellt
+        self.ereignisse = EreignisBus()
+        self._ausstehende_ereignisse = []
+        with StartProfil.abschnitt("Datenbank öffnen"):
+            self.verbinde()
+        if nur_lesen:
+            self.pruefe_schema()
+            return
+        with StartProfil.abschnitt("Migration"):
+            self.migriere()
 
     def verbinde(self):
+        if self.nur_lesen:
+            self.conn = sqlite3.connect(
+                f"{Path(self.datei).resolve().as_uri()}?mode=ro", uri=True, timeout=self.BUSY_TIMEOUT_SEKUNDEN,
+                check_same_thread=False, cached_statements=self.STATEMENT_CACHE,
+                detect_types=sqlite3.PARSE_DECLTYPES,
+            )
+            self.conn.execute("PRAGMA query_only = ON")
+            return
         try:
-            self.conn = sqlite3.connect(self.datei)
-            self.conn.row_factory = sqlite3.Row  # Für dict-ähnliche Rückgabe
-            self.cursor = self.conn.cursor()
-            print("SQLite-Verbindung erfolgreich.")
-        except Error as e:
-            print(f"Fehler bei Verbindung zur SQLite-DB: {e}")
+            # Jede Abfrage nutzt einen eigenen Cursor (conn.execute); Zeilen kommen als Tupel
+            # und werden direkt in die Zeilentypen aus datensaetze.py übernommen
+            # timeout setzt den Busy-Handler (entspricht PRAGMA busy_timeout)
+            self.conn = sqlite3.connect(
+                self.datei, timeout=self.BUSY_TIMEOUT_SEKUNDEN,
+                cached_statements=self.STATEMENT_CACHE, detect_types=sqlite3.PARSE_DECLTYPES
+            )
+            self.conn.execute("PRAGMA foreign_keys = ON")
+            # WAL: Leser blockieren Schreiber nicht; NORMAL spart das fsync pro Commit (sicher im WAL-Modus).
+            # WAL setzt voraus, dass alle Prozesse auf demselben Rechner laufen (kein Netzlaufwerk).
+            self.conn.execute("PRAGMA journal_mode = WAL")
+            self.conn.execute("PRAGMA synchronous = NORMAL")
+            logger.info("SQLite-Verbindung zu %s erfolgreich.", self.datei)
+        except Error:
+            logger.exception("Fehler bei Verbindung zur SQLite-DB %s", self.datei)
 
     def schliesse_verbindung(self):
-        if self.cursor:
-            self.cursor.close()
         if self.conn:
             self.conn.close()
 
+    @contextmanager
+    def transaktion(self):
+        # Fasst mehrere Schreiboperationen zu einem Commit zusammen; verschachtelte Aufrufe
+        # laufen in der äußersten Transaktion mit. IMMEDIATE holt die Schreibsperre sofort (mit
+        # Busy-Timeout), statt später beim ersten Schreiben ohne Warten an einem anderen Schreiber zu scheitern.
+        if self._transaktionstiefe == 0:
+            self.conn.commit()
+            self.conn.execute("BEGIN IMMEDIATE")
+        self._transaktionstiefe += 1
+        try:
+            yield self
+        except Exception:
+            self._transaktionstiefe -= 1
+            if self._transaktionstiefe == 0:
+                self.conn.rollback()
+                self._ausstehende_ereignisse.clear()
+            raise
+        self._transaktionstiefe -= 1
+        if self._transaktionstiefe == 0:
+            self.conn.commit()
+            self._stelle_ereignisse_zu()
+
+    def _commit(self):
+        if self._transaktionstiefe == 0:
+            self.conn.commit()
+
+    def _melde(self, ereignis):
+        self._ausstehende_ereignisse.append(ereignis)
+        if self._transaktionstiefe == 0:
+            self._stelle_ereignisse_zu()
+
+    def _stelle_ereignisse_zu(self):
+        ereignisse, self._ausstehende_ereignisse = self._ausstehende_ereignisse, []
+        for ereignis in ereignisse:
+            self.ereignisse.veroeffentliche(ereignis)
+
+    def schema_version(self):
+        return self.conn.execute("PRAGMA user_version").fetchone()[0]
+
+    def pruefe_schema(self):
+        # Lesende Verbindungen migrieren nicht; die Datei muss bereits auf dem aktuellen Stand sein.
+        # Schlägt die Prüfung fehl, wird die Verbindung geschlossen: der Aufrufer erhält kein Objekt.
+        try:
+            version = self.schema_version()
+            if version != len(self.MIGRATIONEN):
+                raise Error(f"{self.datei}: Schema-Version {version}, erwartet {len(self.MIGRATIONEN)} "
+                            f"(Datei zuerst mit der Anwendung öffnen)")
+        except Exception:
+            self.schliesse_verbindung()
+            raise
+
+    def sichere_vor_migration(self, version):
+        # Kopie der bestehenden Datei anlegen, bevor ihr Schema verändert wird
+        if self.datei == ':memory:':
+            return
+        vorhanden = self.conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table'").fetchone()[0]
+        if not vorhanden:
+            return
+        backup = sqlite3.connect(f"{self.datei}.v{version}.bak")
+        try:
+            self.conn.backup(backup)
+        finally:
+            backup.close()
+
+    def migriere(self):
+        version = self.schema_version()
+        if version >= len(self.MIGRATIONEN):
+            return
+
+        self.sichere_vor_migration(version)
+
+        # Tabellen-Neuaufbau ist nur mit deaktivierten Foreign Keys möglich (außerhalb der Transaktion setzen)
+        self.conn.commit()
+        self.conn.execute("PRAGMA foreign_keys = OFF")
+        try:
+            # Alle ausstehenden Migrationen in einer Transaktion: entweder vollständig oder gar nicht
+            # (auch Hilfsmethoden mit eigener transaktion() laufen darin mit)
+            with self.transaktion():
+                # Ein anderer Prozess kann während des Wartens auf die Sperre bereits migriert haben
+                version = self.schema_version()
+                if version >= len(self.MIGRATIONEN):
+                    return
+                for ziel_version in range(version + 1, len(self.MIGRATIONEN) + 1):
+                    getattr(self, self.MIGRATIONEN[ziel_version - 1])()
+                verletzungen = self.conn.execute("PRAGMA foreign_key_check").fetchall()
+                if verletzungen:
+                    raise Error(f"Migration: {len(verletzungen)} Foreign-Key-Verletzungen")
+                self.conn.execute(f"PRAGMA user_version = {len(self.MIGRATIONEN)}")
+            logger.info("Datenbank von Schema-Version %d auf %d migriert.", version, len(self.MIGRATIONEN))
+        finally:
+            self.conn.execute("PRAGMA foreign_keys = ON")
+
     def erstelle_tabellen(self):
         mitarbeiter_sql = """
         CREATE TABLE IF NOT EXISTS mitarbeiter (
@@ -55,58 +344,501 @@ class Datenbank:
         END;
         """
 
-        self.cursor.execute(mitarbeiter_sql)
-        self.cursor.execute(kalender_sql)
-        self.cursor.execute(trigger_sql)
-        self.conn.commit()
+        feiertage_sql = """
+        CREATE TABLE IF NOT EXISTS feiertage (
+            land TEXT NOT NULL,
+            jahr INTEGER NOT NULL,
+            datum TEXT NOT NULL,
+            name TEXT NOT NULL,
+            quelle TEXT DEFAULT 'lokal',
+            PRIMARY KEY (land, jahr, name)
+        );
+        """
+
+        tagespunkte_sql = """
+        CREATE TABLE IF NOT EXISTS tagespunkte (
+            datum TEXT PRIMARY KEY,
+            punkte INTEGER NOT NULL
+        ) WITHOUT ROWID;
+        """
+
+        self.conn.execute(mitarbeiter_sql)
+        self.conn.execute(kalender_sql)
+        self.conn.execute(trigger_sql)
+        self.conn.execute(feiertage_sql)
+        self.conn.execute(tagespunkte_sql)
+
+    def migration_indizes_und_eindeutigkeit(self):
+        # Verwaiste Einträge (Mitarbeiter bereits gelöscht) und Duplikate je Tag/Mitarbeiter entfernen
+        self.conn.execute("""
+        DELETE FROM kalender_mitarbeiter
+        WHERE mitarbeiter_id NOT IN (SELECT mitarbeiter_id FROM mitarbeiter)
+        """)
+        self.conn.execute("""
+        DELETE FROM kalender_mitarbeiter
+        WHERE id NOT IN (SELECT MIN(id) FROM kalender_mitarbeiter GROUP BY datum, mitarbeiter_id)
+        """)
+
+        # Tabelle mit UNIQUE-Constraint und ON DELETE CASCADE neu aufbauen
+        self.conn.execute("""
+        CREATE TABLE kalender_mitarbeiter_neu (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            datum TEXT NOT NULL,
+            mitarbeiter_id INTEGER NOT NULL,
+            erstellt_am TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            aktualisiert_am TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (datum, mitarbeiter_id),
+            FOREIGN KEY (mitarbeiter_id) REFERENCES mitarbeiter(mitarbeiter_id) ON DELETE CASCADE
+        );
+        """)
+        self.conn.execute("""
+        INSERT INTO kalender_mitarbeiter_neu (id, datum, mitarbeiter_id, erstellt_am, aktualisiert_am)
+        SELECT id, datum, mitarbeiter_id, erstellt_am, aktualisiert_am FROM kalender_mitarbeiter
+        """)
+        self.conn.execute("DROP TABLE kalender_mitarbeiter")
+        self.conn.execute("ALTER TABLE kalender_mitarbeiter_neu RENAME TO kalender_mitarbeiter")
+
+        self.conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS update_kalender_mitarbeiter_timestamp
+        AFTER UPDATE ON kalender_mitarbeiter
+        FOR EACH ROW
+        BEGIN
+            UPDATE kalender_mitarbeiter SET aktualisiert_am = CURRENT_TIMESTAMP WHERE id = OLD.id;
+        END;
+        """)
+
+        # UNIQUE (datum, mitarbeiter_id) deckt Datumsbereiche ab, dieser Index die Abfragen je Mitarbeiter
+        self.conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_kalender_mitarbeiter_mitarbeiter
+        ON kalender_mitarbeiter (mitarbeiter_id, datum)
+        """)
+
+    def migration_punkte_monat(self):
+        # Monatssummen je Mitarbeiter, durch Trigger auf kalender_mitarbeiter aktuell gehalten
+        self.conn.execute("""
+        CREATE TABLE IF NOT EXISTS punkte_monat (
+            mitarbeiter_id INTEGER NOT NULL,
+            monat TEXT NOT NULL,
+            ist_punkte INTEGER NOT NULL DEFAULT 0,
+            werktage INTEGER NOT NULL DEFAULT 0,
+            wochenendtage INTEGER NOT NULL DEFAULT 0,
+            feiertage INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (mitarbeiter_id, monat)
+        ) WITHOUT ROWID;
+        """)
+        self.erstelle_punkte_monat_trigger()
+        self.baue_punkte_monat_neu()
+
+    def migration_datumsspalten(self):
+        # Datumsspalten als 'DATE TEXT' deklarieren und Altbestände (z.B. 'YYYY-MM-DD HH:MM:SS') normalisieren
+        ungueltig = self.conn.execute(
+            "SELECT COUNT(*) FROM kalender_mitarbeiter WHERE date(datum) IS NULL"
+        ).fetchone()[0]
+        if ungueltig:
+            logger.warning("Migration: %d Kalendereinträge mit ungültigem Datum werden entfernt.", ungueltig)
+        # Unlesbare Eintrittsdaten werden NULL (Soll dann ab Zeitraumbeginn); betroffene Mitarbeiter protokollieren
+        for mitarbeiter_id, vorname, nachname, eintritt in self.conn.execute("""
+        SELECT mitarbeiter_id, mitarbeiter_vorname, mitarbeiter_nachname, mitarbeiter_eintritt FROM mitarbeiter
+        WHERE mitarbeiter_eintritt IS NOT NULL AND date(mitarbeiter_eintritt) IS NULL
+        """).fetchall():
+            logger.warning("Migration: Eintrittsdatum %r von Mitarbeiter %d (%s %s) ist ungültig und wird entfernt; "
+                           "bitte in der Mitarbeiterliste neu eintragen.", eintritt, mitarbeiter_id, vorname, nachname)
+
+        self._baue_tabelle_neu("mitarbeiter", """
+        CREATE TABLE mitarbeiter_neu (
+            mitarbeiter_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            mitarbeiter_vorname TEXT DEFAULT NULL,
+            mitarbeiter_nachname TEXT DEFAULT NULL,
+            mitarbeiter_eintritt DATE TEXT DEFAULT NULL,
+            mitarbeiter_farbe TEXT DEFAULT '#ffffff'
+        );
+        """, """
+        INSERT INTO mitarbeiter_neu
+        SELECT mitarbeiter_id, mitarbeiter_vorname, mitarbeiter_nachname, date(mitarbeiter_eintritt), mitarbeiter_farbe
+        FROM mitarbeiter
+        """)
+
+        # Nach dem Normalisieren können Duplikate je Tag/Mitarbeiter entstehen; der älteste Eintrag bleibt
+        self._baue_tabelle_neu("kalender_mitarbeiter", """
+        CREATE TABLE kalender_mitarbeiter_neu (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            datum DATE TEXT NOT NULL,
+            mitarbeiter_id INTEGER NOT NULL,
+            erstellt_am TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            aktualisiert_am TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (datum, mitarbeiter_id),
+            FOREIGN KEY (mitarbeiter_id) REFERENCES mitarbeiter(mitarbeiter_id) ON DELETE CASCADE
+        );
+        """, """
+        INSERT INTO kalender_mitarbeiter_neu (id, datum, mitarbeiter_id, erstellt_am, aktualisiert_am)
+        SELECT id, date(datum), mitarbeiter_id, erstellt_am, aktualisiert_am
+        FROM kalender_mitarbeiter
+        WHERE id IN (
+            SELECT MIN(id) FROM kalender_mitarbeiter
+            WHERE date(datum) IS NOT NULL
+            GROUP BY date(datum), mitarbeiter_id
+        )
+        """)
+
+        # Mit der alten Tabelle sind Trigger und Index entfallen
+        self.conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS update_kalender_mitarbeiter_timestamp
+        AFTER UPDATE ON kalender_mitarbeiter
+        FOR EACH ROW
+        BEGIN
+            UPDATE kalender_mitarbeiter SET aktualisiert_am = CURRENT_TIMESTAMP WHERE id = OLD.id;
+        END;
+        """)
+        self.conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_kalender_mitarbeiter_mitarbeiter
+        ON kalender_mitarbeiter (mitarbeiter_id, datum)
+        """)
+        self.erstelle_punkte_monat_trigger()
+        self.baue_punkte_monat_neu()
+
+    def migration_zeilenversion(self):
+        # Zeilenversion für optimistische Sperren: jede Aktualisierung erhöht sie um 1
+        # (aktualisiert_am hat nur Sekundenauflösung und fehlt bei mitarbeiter)
+        self.conn.execute("ALTER TABLE mitarbeiter ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+        self.conn.execute("ALTER TABLE kalender_mitarbeiter ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+
+    def migration_datenstand(self):
+        # Zähler, der bei jeder Änderung an Mitarbeitern, Einträgen oder Feiertagen steigt.
+        # Lesende Prozesse erkennen daran mit einer einzigen Abfrage, ob sich etwas geändert hat.
+        self.conn.execute("""
+        CREATE TABLE IF NOT EXISTS datenstand (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            zaehler INTEGER NOT NULL
+        )
+        """)
+        self.conn.execute("INSERT OR IGNORE INTO datenstand (id, zaehler) VALUES (1, 0)")
+        for tabelle in self.DATENSTAND_TABELLEN:
+            for aktion in ("INSERT", "UPDATE", "DELETE"):
+                self.conn.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS datenstand_{tabelle}_{aktion.lower()}
+                AFTER {aktion} ON {tabelle}
+                BEGIN
+                    UPDATE datenstand SET zaehler = zaehler + 1 WHERE id = 1;
+                END;
+                """)
+
+    def _baue_tabelle_neu(self, tabelle, create_sql, insert_sql):
+        # Tabelle über '<tabelle>_neu' neu aufbauen; der AUTOINCREMENT-Zähler bleibt erhalten
+        zaehler = self.conn.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (tabelle,)).fetchone()
+        self.conn.execute(create_sql)
+        self.conn.execute(insert_sql)
+        self.conn.execute(f"DROP TABLE {tabelle}")
+        self.conn.execute(f"ALTER TABLE {tabelle}_neu RENAME TO {tabelle}")
+        if zaehler is not None:
+            self.conn.execute("DELETE FROM sqlite_sequence WHERE name = ?", (tabelle,))
+            self.conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)", (tabelle, zaehler[0]))
+
+    def erstelle_punkte_monat_trigger(self):
+        self.conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS punkte_monat_nach_insert
+        AFTER INSERT ON kalender_mitarbeiter
+        FOR EACH ROW
+        BEGIN
+            {punkte_monat_aenderung_sql('NEW', 1)}
+        END;
+        """)
+        self.conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS punkte_monat_nach_delete
+        AFTER DELETE ON kalender_mitarbeiter
+        FOR EACH ROW
+        BEGIN
+            {punkte_monat_aenderung_sql('OLD', -1)}
+            {leere_punkte_monat_sql('OLD')}
+        END;
+        """)
+        self.conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS punkte_monat_nach_update
+        AFTER UPDATE OF datum, mitarbeiter_id ON kalender_mitarbeiter
+        FOR EACH ROW
+        BEGIN
+            {punkte_monat_aenderung_sql('OLD', -1)}
+            {leere_punkte_monat_sql('OLD')}
+            {punkte_monat_aenderung_sql('NEW', 1)}
+        END;
+        """)
+
+    @mit_wiederholung
+    def baue_punkte_monat_neu(self, von_monat='0000-00', bis_monat='9999-99'):
+        # Monatssummen (Format 'YYYY-MM') vollständig aus den Rohdaten neu berechnen
+        with self.transaktion():
+            self.conn.execute("DELETE FROM punkte_monat WHERE monat BETWEEN ? AND ?", (von_monat, bis_monat))
+            self.conn.execute(f"""
+            INSERT INTO punkte_monat (mitarbeiter_id, monat, ist_punkte, werktage, wochenendtage, feiertage)
+            SELECT x.mitarbeiter_id,
+                   substr(x.datum, 1, 7),
+                   SUM(COALESCE(t.punkte, x.kat)),
+                   SUM(x.kat = 1),
+                   SUM(x.kat = 2),
+                   SUM(x.kat = 3)
+            FROM (
+                SELECT k.mitarbeiter_id, k.datum, {tageskategorie_sql('k.datum')} AS kat
+                FROM kalender_mitarbeiter k
+                WHERE k.datum BETWEEN ? || '-01' AND ? || '-31'
+            ) x
+            LEFT JOIN tagespunkte t ON t.datum = x.datum
+            GROUP BY x.mitarbeiter_id, substr(x.datum, 1, 7)
+            """, (von_monat, bis_monat))
+
+    def lade_datenstand(self):
+        return self.conn.execute("SELECT zaehler FROM datenstand WHERE id = 1").fetchone()[0]
 
     def lade_mitarbeiter(self):
-        query = "SELECT mitarbeiter_id, mitarbeiter_vorname, mitarbeiter_nachname, mitarbeiter_eintritt, mitarbeiter_farbe FROM mitarbeiter"
-        self.cursor.execute(query)
-        return [dict(row) for row in self.cursor.fetchall()]
+        return list(starmap(Mitarbeiter, self.conn.execute(self.SQL_MITARBEITER)))
+
+    def _pruefe_version(self, tabelle, id_spalte, zeilen_id):
+        # Nach einer Aktualisierung ohne Treffer: gelöscht oder von anderer Seite geändert?
+        zeile = self.conn.execute(f"SELECT version FROM {tabelle} WHERE {id_spalte} = ?", (zeilen_id,)).fetchone()
+        if zeile is None:
+            raise KonfliktFehler(f"{tabelle} {zeilen_id} wurde inzwischen gelöscht.")
+        raise KonfliktFehler(f"{tabelle} {zeilen_id} wurde inzwischen geändert (Version {zeile[0]}).")
 
+    @mit_wiederholung
     def fuege_mitarbeiter_hinzu(self, vorname, nachname, eintritt, farbe):
         query = """
         INSERT INTO mitarbeiter (mitarbeiter_vorname, mitarbeiter_nachname, mitarbeiter_eintritt, mitarbeiter_farbe)
         VALUES (?, ?, ?, ?)
         """
-        self.cursor.execute(query, (vorname, nachname, eintritt, farbe))
-        self.conn.commit()
+        mitarbeiter_id = self.conn.execute(query, (vorname, nachname, eintritt, farbe)).lastrowid
+        self._commit()
+        self._melde(MitarbeiterHinzugefuegt(
+            mitarbeiter_id, Mitarbeiter(mitarbeiter_id, vorname, nachname, eintritt, farbe)))
+        return mitarbeiter_id
 
-    def aktualisiere_mitarbeiter(self, mitarbeiter_id, vorname, nachname, eintritt, farbe):
+    @mit_wiederholung
+    def aktualisiere_mitarbeiter(self, mitarbeiter_id, vorname, nachname, eintritt, farbe, version=None):
+        # version: beim Laden gelesene Zeilenversion. Hat eine andere Sitzung den Mitarbeiter
+        # inzwischen geändert, wird KonfliktFehler ausgelöst statt ihre Änderung zu überschreiben.
+        # Ohne version gilt "letzter Schreiber gewinnt". Gibt die neue Version zurück.
         query = """
         UPDATE mitarbeiter
-        SET mitarbeiter_vorname = ?, mitarbeiter_nachname = ?, mitarbeiter_eintritt = ?, mitarbeiter_farbe = ?
-        WHERE mitarbeiter_id = ?
+        SET mitarbeiter_vorname = ?, mitarbeiter_nachname = ?, mitarbeiter_eintritt = ?, mitarbeiter_farbe = ?,
+            version = version + 1
+        WHERE mitarbeiter_id = ? AND (? IS NULL OR version = ?)
+        RETURNING version
         """
-        self.cursor.execute(query, (vorname, nachname, eintritt, farbe, mitarbeiter_id))
-        self.conn.commit()
+        with self.transaktion():
+            zeilen = self.conn.execute(
+                query, (vorname, nachname, eintritt, farbe, mitarbeiter_id, version, version)).fetchall()
+            if not zeilen:
+                self._pruefe_version("mitarbeiter", "mitarbeiter_id", mitarbeiter_id)
+            neue_version = zeilen[0][0]
+            self._melde(MitarbeiterGeaendert(
+                mitarbeiter_id, Mitarbeiter(mitarbeiter_id, vorname, nachname, eintritt, farbe, neue_version)))
+            return neue_version
 
+    @mit_wiederholung
     def loesche_mitarbeiter(self, mitarbeiter_id):
+        # Die Kalendereinträge werden per ON DELETE CASCADE mitgelöscht
+        daten = frozenset(row[0] for row in self.conn.execute(
+            "SELECT DISTINCT datum FROM kalender_mitarbeiter WHERE mitarbeiter_id = ?", (mitarbeiter_id,)))
         query = "DELETE FROM mitarbeiter WHERE mitarbeiter_id = ?"
-        self.cursor.execute(query, (mitarbeiter_id,))
-        self.conn.commit()
+        self.conn.execute(query, (mitarbeiter_id,))
+        self._commit()
+        self._melde(MitarbeiterGeloescht(mitarbeiter_id))
+        if daten:
+            self._melde(EintraegeEntfernt(daten))
 
     def lade_kalender_eintraege(self, datum):
-        query = """
-        SELECT k.id, k.datum, k.mitarbeiter_id, m.mitarbeiter_vorname, m.mitarbeiter_nachname
-        FROM kalender_mitarbeiter k
-        JOIN mitarbeiter m ON k.mitarbeiter_id = m.mitarbeiter_id
-        WHERE k.datum = ?
-        """
-        self.cursor.execute(query, (datum,))
-        return [dict(row) for row in self.cursor.fetchall()]
+        return self.lade_kalender_eintraege_im_zeitraum(datum, datum)
+
+    def lade_kalender_eintraege_im_zeitraum(self, start_datum, end_datum):
+        return list(self.iteriere_kalender_eintraege(start_datum, end_datum))
 
+    def iteriere_kalender_eintraege(self, start_datum, end_datum, mitarbeiter_id=None):
+        # Für große Zeiträume: Zeilen werden erst beim Iterieren aus SQLite gelesen
+        if mitarbeiter_id is None:
+            cursor = self.conn.execute(self.SQL_KALENDER_EINTRAEGE, (start_datum, end_datum))
+        else:
+            cursor = self.conn.execute(self.SQL_KALENDER_EINTRAEGE_MITARBEITER, (mitarbeiter_id, start_datum, end_datum))
+        return starmap(KalenderEintrag, cursor)
+
+    def lade_kalender_jahresbereich(self):
+        # (erstes Jahr, letztes Jahr) mit Einträgen oder None bei leerem Kalender
+        erster, letzter = self.conn.execute("SELECT MIN(datum), MAX(datum) FROM kalender_mitarbeiter").fetchone()
+        if erster is None:
+            return None
+        return int(erster[:4]), int(letzter[:4])
+
+    @mit_wiederholung
     def fuege_kalender_eintrag_hinzu(self, datum, mitarbeiter_id):
         query = "INSERT INTO kalender_mitarbeiter (datum, mitarbeiter_id) VALUES (?, ?)"
-        self.cursor.execute(query, (datum, mitarbeiter_id))
-        self.conn.commit()
+        kalender_id = self.conn.execute(query, (datum, mitarbeiter_id)).lastrowid
+        self._commit()
+        self._melde(EintraegeHinzugefuegt(frozenset([als_datum(datum)])))
+        return kalender_id
+
+    @mit_wiederholung
+    def fuege_kalender_eintraege_hinzu(self, eintraege):
+        # eintraege: Iterable von (datum, mitarbeiter_id); bereits vorhandene werden übersprungen
+        eintraege = list(eintraege)
+        query = "INSERT OR IGNORE INTO kalender_mitarbeiter (datum, mitarbeiter_id) VALUES (?, ?)"
+        with self.transaktion():
+            anzahl = self.conn.executemany(query, eintraege).rowcount
+            if anzahl:
+                self._melde(EintraegeHinzugefuegt(frozenset(als_datum(datum) for datum, _ in eintraege)))
+            return anzahl
+
+    def weise_zeitraum_zu(self, mitarbeiter_id, start, ende, wochentage=None):
+        # Trägt den Mitarbeiter an allen Tagen von start bis ende ein (optional nur an bestimmten
+        # Wochentagen, 0 = Montag ... 6 = Sonntag)
+        eintraege = []
+        tag = start
+        while tag <= ende:
+            if wochentage is None or tag.weekday() in wochentage:
+                eintraege.append((tag, mitarbeiter_id))
+            tag += timedelta(days=1)
+        return self.fuege_kalender_eintraege_hinzu(eintraege)
+
+    def weise_rotation_zu(self, mitarbeiter_ids, start, ende, tage_pro_schicht=7):
+        # Wechselt reihum alle tage_pro_schicht Tage zum nächsten Mitarbeiter (z.B. wöchentliche Rotation)
+        if not mitarbeiter_ids:
+            return 0
+        eintraege = []
+        tag = start
+        index = 0
+        while tag <= ende:
+            mitarbeiter_id = mitarbeiter_ids[(index // tage_pro_schicht) % len(mitarbeiter_ids)]
+            eintraege.append((tag, mitarbeiter_id))
+            tag += timedelta(days=1)
+            index += 1
+        return self.fuege_kalender_eintraege_hinzu(eintraege)
+
+    @mit_wiederholung
+    def wende_kalender_aenderungen_an(self, hinzufuegen, entfernen):
+        # Gesammelte Änderungen (je eine Liste von (datum, mitarbeiter_id)) in einer Transaktion schreiben.
+        # Einträge für inzwischen gelöschte Mitarbeiter werden übersprungen. Gemeldet werden alle
+        # übergebenen Tage, damit Ansichten mit vorgemerkten Änderungen den gespeicherten Stand übernehmen.
+        with self.transaktion():
+            if hinzufuegen:
+                self.conn.executemany("""
+                INSERT OR IGNORE INTO kalender_mitarbeiter (datum, mitarbeiter_id)
+                SELECT ?, mitarbeiter_id FROM mitarbeiter WHERE mitarbeiter_id = ?
+                """, hinzufuegen)
+                self._melde(EintraegeHinzugefuegt(frozenset(als_datum(datum) for datum, _ in hinzufuegen)))
+            if entfernen:
+                self.conn.executemany(
+                    "DELETE FROM kalender_mitarbeiter WHERE datum = ? AND mitarbeiter_id = ?", entfernen)
+                self._melde(EintraegeEntfernt(frozenset(als_datum(datum) for datum, _ in entfernen)))
+
+    @mit_wiederholung
+    def loesche_kalender_eintrag(self, eintrag_id):
+        daten = frozenset(row[0] for row in self.conn.execute(
+            "DELETE FROM kalender_mitarbeiter WHERE id = ? RETURNING datum", (eintrag_id,)))
+        self._commit()
+        if daten:
+            self._melde(EintraegeEntfernt(daten))
 
-    def aktualisiere_kalender_eintrag(self, eintrag_id, neues_datum, neue_mitarbeiter_id):
+    @mit_wiederholung
+    def loesche_kalender_eintraege_im_zeitraum(self, start_datum, end_datum, mitarbeiter_id=None):
+        if mitarbeiter_id is None:
+            cursor = self.conn.execute(
+                "DELETE FROM kalender_mitarbeiter WHERE datum BETWEEN ? AND ? RETURNING datum",
+                (start_datum, end_datum)
+            )
+        else:
+            cursor = self.conn.execute(
+                "DELETE FROM kalender_mitarbeiter WHERE datum BETWEEN ? AND ? AND mitarbeiter_id = ? RETURNING datum",
+                (start_datum, end_datum, mitarbeiter_id)
+            )
+        geloescht = [row[0] for row in cursor]
+        self._commit()
+        if geloescht:
+            self._melde(EintraegeEntfernt(frozenset(geloescht)))
+        return len(geloescht)
+
+    @mit_wiederholung
+    def aktualisiere_kalender_eintrag(self, eintrag_id, neues_datum, neue_mitarbeiter_id, version=None):
+        # version wie bei aktualisiere_mitarbeiter; gibt die neue Version zurück
         query = """
         UPDATE kalender_mitarbeiter
-        SET datum = ?, mitarbeiter_id = ?
-        WHERE id = ?
+        SET datum = ?, mitarbeiter_id = ?, version = version + 1
+        WHERE id = ? AND (? IS NULL OR version = ?)
+        RETURNING version
         """
-        self.cursor.execute(query, (neues_datum, neue_mitarbeiter_id, eintrag_id))
-        self.conn.commit()
+        with self.transaktion():
+            alt = self.conn.execute("SELECT datum FROM kalender_mitarbeiter WHERE id = ?", (eintrag_id,)).fetchone()
+            zeilen = self.conn.execute(query, (neues_datum, neue_mitarbeiter_id, eintrag_id, version, version)).fetchall()
+            if not zeilen:
+                self._pruefe_version("kalender_mitarbeiter", "id", eintrag_id)
+            self._melde(EintraegeGeaendert(frozenset([alt[0], als_datum(neues_datum)])))
+            return zeilen[0][0]
+
+    def lade_feiertage(self, jahr, land):
+        query = "SELECT name, datum FROM feiertage WHERE land = ? AND jahr = ? ORDER BY datum"
+        return {name: {'datum': datum, 'hinweis': ''} for name, datum in self.conn.execute(query, (land, jahr))}
+
+    @mit_wiederholung
+    def speichere_feiertage(self, jahr, land, feiertage, quelle='lokal'):
+        with self.transaktion():
+            self.conn.execute("DELETE FROM feiertage WHERE land = ? AND jahr = ?", (land, jahr))
+            self.conn.executemany(
+                "INSERT INTO feiertage (land, jahr, datum, name, quelle) VALUES (?, ?, ?, ?, ?)",
+                [(land, jahr, info['datum'], name, quelle) for name, info in feiertage.items()]
+            )
+            if land == 'NW':
+                # Die Tageskategorien der Monatssummen beziehen sich auf die NRW-Feiertage
+                self.baue_punkte_monat_neu(f"{jahr}-01", f"{jahr}-12")
+
+    @mit_wiederholung
+    def speichere_tagespunkte(self, tagespunkte):
+        # tagespunkte: Liste von (datum, punkte). Ändern sich Punkte,
+        # werden die Monatssummen der betroffenen Monate neu aufgebaut.
+        if not tagespunkte:
+            return
+        with self.transaktion():
+            vorher = self.conn.total_changes
+            self.conn.executemany("""
+            INSERT INTO tagespunkte (datum, punkte) VALUES (?, ?)
+            ON CONFLICT (datum) DO UPDATE SET punkte = excluded.punkte WHERE punkte != excluded.punkte
+            """, tagespunkte)
+            if self.conn.total_changes != vorher:
+                daten = [datum for datum, _ in tagespunkte]
+                self.baue_punkte_monat_neu(f"{min(daten):%Y-%m}", f"{max(daten):%Y-%m}")
+
+    def lade_ist_punkte_je_mitarbeiter(self, start, ende):
+        # Summiert die Punkte aller Einträge im Zeitraum direkt in SQLite (eine Zeile je Mitarbeiter):
+        # volle Monate aus punkte_monat, angebrochene Randmonate aus den Rohdaten
+        naechster_monat = (ende.replace(day=28) + timedelta(days=4)).replace(day=1)
+        erster_voller = start if start.day == 1 else (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+        letzter_voller = ende if naechster_monat - timedelta(days=1) == ende else ende.replace(day=1) - timedelta(days=1)
+
+        if erster_voller > letzter_voller:
+            query = """
+            SELECT k.mitarbeiter_id, SUM(t.punkte) AS punkte
+            FROM kalender_mitarbeiter k
+            JOIN tagespunkte t ON t.datum = k.datum
+            WHERE k.datum BETWEEN ? AND ?
+            GROUP BY k.mitarbeiter_id
+            """
+            cursor = self.conn.execute(query, (start, ende))
+        else:
+            query = """
+            SELECT mitarbeiter_id, SUM(punkte) AS punkte
+            FROM (
+                SELECT mitarbeiter_id, ist_punkte AS punkte
+                FROM punkte_monat
+                WHERE monat BETWEEN ? AND ?
+                UNION ALL
+                SELECT k.mitarbeiter_id, t.punkte
+                FROM kalender_mitarbeiter k
+                JOIN tagespunkte t ON t.datum = k.datum
+                WHERE k.datum BETWEEN ? AND ?
+                UNION ALL
+                SELECT k.mitarbeiter_id, t.punkte
+                FROM kalender_mitarbeiter k
+                JOIN tagespunkte t ON t.datum = k.datum
+                WHERE k.datum BETWEEN ? AND ?
+            )
+            GROUP BY mitarbeiter_id
+            """
+            cursor = self.conn.execute(query, (
+                f"{erster_voller:%Y-%m}", f"{letzter_voller:%Y-%m}",
+                start, erster_voller - timedelta(days=1),
+                letzter_voller + timedelta(days=1), ende,
+            ))
+        return dict(cursor.fetchall())
@@ -0,0 +1,28 @@
+from dataclasses import dataclass
+from datetime import date
+
+
+# Zeilentypen der Datenbank. slots=True: kein __dict__ je Zeile, deutlich kleiner als ein dict.
+# Die Feldreihenfolge entspricht der Spaltenreihenfolge der zugehörigen SELECTs in datenbank.py.
+
+@dataclass(slots=True)
+class Mitarbeiter:
+    mitarbeiter_id: int
+    vorname: str
+    nachname: str
+    eintritt: date | None
+    farbe: str
+    version: int = 0  # Zeilenversion für optimistische Sperren
+
+    @property
+    def name(self):
+        return f"{self.vorname} {self.nachname}"
+
+
+@dataclass(slots=True)
+class KalenderEintrag:
+    id: int
+    datum: date
+    mitarbeiter_id: int
+    name: str  # Vor- und Nachname des Mitarbeiters
+    version: int = 0
@@ -0,0 +1,100 @@
+from PyQt5.QtWidgets import (
+    QWidget, QVBoxLayout, QHBoxLayout, QTableWidget, QTableWidgetItem,
+    QLabel, QPushButton, QFileDialog, QHeaderView
+)
+from PyQt5.QtCore import Qt, QTimer
+
+from messung import MESSUNG_UMGEBUNGSVARIABLE, Messung
+
+
+class DiagnoseWidget(QWidget):
+    # Zeigt die Messwerte aus messung.py; wird nur über Strg+Umschalt+D eingeblendet
+    AKTUALISIERUNG_MS = 1000
+    SPALTEN = ["Messpunkt", "Anzahl", "p50 ms", "p90 ms", "p99 ms", "Max ms", "Summe ms"]
+
+    def __init__(self):
+        super().__init__()
+        self.setLayout(QVBoxLayout())
+
+        self.status = QLabel()
+        self.layout().addWidget(self.status)
+
+        self.messpunkte = QTableWidget(0, len(self.SPALTEN))
+        self.messpunkte.setHorizontalHeaderLabels(self.SPALTEN)
+        self.messpunkte.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.messpunkte.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.messpunkte.verticalHeader().hide()
+        self.layout().addWidget(self.messpunkte, 3)
+
+        self.zaehler = QTableWidget(0, 2)
+        self.zaehler.setHorizontalHeaderLabels(["Zähler", "Anzahl"])
+        self.zaehler.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.zaehler.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.zaehler.verticalHeader().hide()
+        self.layout().addWidget(self.zaehler, 1)
+
+        knoepfe = QHBoxLayout()
+        self.btn_json = QPushButton("Als JSON speichern …")
+        self.btn_json.clicked.connect(self.als_json_speichern)
+        self.btn_zuruecksetzen = QPushButton("Zurücksetzen")
+        self.btn_zuruecksetzen.clicked.connect(self.zuruecksetzen)
+        knoepfe.addStretch()
+        knoepfe.addWidget(self.btn_zuruecksetzen)
+        knoepfe.addWidget(self.btn_json)
+        self.layout().addLayout(knoepfe)
+
+        # Nur aktualisieren, solange der Tab sichtbar ist
+        self.zeitgeber = QTimer(self)
+        self.zeitgeber.setInterval(self.AKTUALISIERUNG_MS)
+        self.zeitgeber.timeout.connect(self.aktualisiere)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.aktualisiere()
+        self.zeitgeber.start()
+
+    def hideEvent(self, event):
+        self.zeitgeber.stop()
+        super().hideEvent(event)
+
+    def aktualisiere(self):
+        bericht = Messung.bericht()
+        if Messung.AKTIV:
+            self.status.setText(f"Messung aktiv seit {bericht['seit']} "
+                                f"(Perzentile über die letzten {bericht['fenster']} Aufrufe je Messpunkt)")
+        else:
+            self.status.setText(f"Messung ausgeschaltet; zum Einschalten {MESSUNG_UMGEBUNGSVARIABLE}=1 "
+                                f"setzen und die Anwendung neu starten.")
+
+        messpunkte = bericht["messpunkte"]
+        self.messpunkte.setRowCount(len(messpunkte))
+        for zeile, (name, werte) in enumerate(messpunkte.items()):
+            self.setze_zeile(self.messpunkte, zeile, [
+                name, werte["anzahl"], f"{werte['p50_ms']:.2f}", f"{werte['p90_ms']:.2f}",
+                f"{werte['p99_ms']:.2f}", f"{werte['max_ms']:.2f}", f"{werte['summe_ms']:.1f}",
+            ])
+
+        zaehler = bericht["zaehler"]
+        self.zaehler.setRowCount(len(zaehler))
+        for zeile, (name, anzahl) in enumerate(zaehler.items()):
+            self.setze_zeile(self.zaehler, zeile, [name, anzahl])
+
+    @staticmethod
+    def setze_zeile(tabelle, zeile, werte):
+        for spalte, wert in enumerate(werte):
+            item = tabelle.item(zeile, spalte)
+            if item is None:
+                item = QTableWidgetItem()
+                if spalte > 0:
+                    item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+                tabelle.setItem(zeile, spalte, item)
+            item.setText(str(wert))
+
+    def als_json_speichern(self):
+        datei, _ = QFileDialog.getSaveFileName(self, "Messwerte speichern", "messwerte.json", "JSON (*.json)")
+        if datei:
+            Messung.schreibe_json(datei)
+
+    def zuruecksetzen(self):
+        Messung.zuruecksetzen()
+        self.aktualisiere()
@@ -0,0 +1,167 @@
+import heapq
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+
+from punkte import PunkteKalender, eintrittsdatum
+
+
+@dataclass
+class Dienstplan:
+    start: date
+    ende: date
+    neue_eintraege: list = field(default_factory=list)  # (datum, mitarbeiter_id)
+    soll: dict = field(default_factory=dict)             # mitarbeiter_id -> Soll-Punkte im Zeitraum
+    ist: dict = field(default_factory=dict)              # mitarbeiter_id -> Ist-Punkte inkl. neuer Einträge
+    unbesetzt: list = field(default_factory=list)        # Tage, für die niemand eingeteilt werden konnte
+
+
+def wochenende_nummer(ordinal):
+    # Samstag und Sonntag desselben Wochenendes erhalten dieselbe Nummer (date.toordinal: Sa % 7 == 6, So % 7 == 0)
+    return (ordinal + 1) // 7
+
+
+class DienstplanGenerator:
+    # Verteilt Rufbereitschaften so, dass das Verhältnis Ist/Soll aller Mitarbeiter möglichst gleich ist.
+    # Regeln: nicht vor dem Eintritt, kein Dienst an zwei aufeinanderfolgenden Wochenenden,
+    # bereits gebuchte Tage bleiben unverändert.
+    MAX_VERBESSERUNGEN = 2000
+
+    def __init__(self, datenbank, punkte_kalender=None):
+        self.db = datenbank
+        self.punkte_kalender = punkte_kalender or PunkteKalender.fuer_land()
+
+    def erzeuge(self, start, ende, mitarbeiter_ids=None, pro_tag=1):
+        plan = Dienstplan(start=start, ende=ende)
+
+        eintritte = {}
+        for mitarbeiter in self.db.lade_mitarbeiter():
+            mid = mitarbeiter.mitarbeiter_id
+            if mitarbeiter_ids is not None and mid not in mitarbeiter_ids:
+                continue
+            eintritt = eintrittsdatum(mitarbeiter) or start
+            if eintritt <= ende:
+                eintritte[mid] = max(eintritt, start)
+        if not eintritte:
+            return plan
+
+        # Bestehende Einträge (mit einer Woche Rand für die Wochenendregel)
+        belegung = {}                                   # ordinal -> set(mitarbeiter_id)
+        wochenenden = {mid: set() for mid in eintritte}
+        for eintrag in self.db.iteriere_kalender_eintraege(start - timedelta(days=7), ende + timedelta(days=7)):
+            ordinal = eintrag.datum.toordinal()
+            mid = eintrag.mitarbeiter_id
+            belegung.setdefault(ordinal, set()).add(mid)
+            if mid in wochenenden and ordinal % 7 in (6, 0):
+                wochenenden[mid].add(wochenende_nummer(ordinal))
+
+        for mid, eintritt in eintritte.items():
+            plan.soll[mid] = self.punkte_kalender.punkte_im_zeitraum(eintritt, ende)
+            plan.ist[mid] = 0
+        for ordinal, mids in belegung.items():
+            if start.toordinal() <= ordinal <= ende.toordinal():
+                punkte = self.punkte_kalender.punkte_pro_tag(date.fromordinal(ordinal))
+                for mid in mids & plan.ist.keys():
+                    plan.ist[mid] += punkte
+
+        # Schwere Tage zuerst verteilen (Feiertage, Wochenenden, dann Werktage)
+        offene_tage = []
+        for ordinal in range(start.toordinal(), ende.toordinal() + 1):
+            fehlend = pro_tag - len(belegung.get(ordinal, ()))
+            if fehlend > 0:
+                punkte = self.punkte_kalender.punkte_pro_tag(date.fromordinal(ordinal))
+                offene_tage.append((-punkte, ordinal, fehlend))
+        offene_tage.sort()
+
+        eintritt_ordinal = {mid: eintritt.toordinal() for mid, eintritt in eintritte.items()}
+        zuteilung = {mid: [] for mid in eintritte}      # mitarbeiter_id -> [(ordinal, punkte)] neu
+
+        def darf(mid, ordinal):
+            if ordinal < eintritt_ordinal[mid] or mid in belegung.get(ordinal, ()):
+                return False
+            if ordinal % 7 in (6, 0):
+                nummer = wochenende_nummer(ordinal)
+                if nummer - 1 in wochenenden[mid] or nummer + 1 in wochenenden[mid]:
+                    return False
+            return True
+
+        def zuteilen(mid, ordinal, punkte):
+            belegung.setdefault(ordinal, set()).add(mid)
+            if ordinal % 7 in (6, 0):
+                wochenenden[mid].add(wochenende_nummer(ordinal))
+            plan.ist[mid] += punkte
+            zuteilung[mid].append((ordinal, punkte))
+
+        def verhaeltnis(mid, zusatz=0):
+            return (plan.ist[mid] + zusatz) / max(plan.soll[mid], 1)
+
+        # Greedy: Heap nach Ist/Soll, abgelehnte Kandidaten werden nach dem Tag zurückgelegt
+        heap = [(verhaeltnis(mid), mid) for mid in eintritte]
+        heapq.heapify(heap)
+        for minus_punkte, ordinal, fehlend in offene_tage:
+            punkte = -minus_punkte
+            zurueck = []
+            while fehlend and heap:
+                wert, mid = heapq.heappop(heap)
+                if wert != verhaeltnis(mid):
+                    heapq.heappush(heap, (verhaeltnis(mid), mid))
+                    continue
+                if darf(mid, ordinal):
+                    zuteilen(mid, ordinal, punkte)
+                    fehlend -= 1
+                zurueck.append(mid)
+            for mid in zurueck:
+                heapq.heappush(heap, (verhaeltnis(mid), mid))
+            if fehlend:
+                plan.unbesetzt.append(date.fromordinal(ordinal))
+
+        self._verbessere(plan, zuteilung, belegung, wochenenden, darf, verhaeltnis)
+
+        for mid, tage in zuteilung.items():
+            for ordinal, _ in tage:
+                plan.neue_eintraege.append((date.fromordinal(ordinal), mid))
+        plan.neue_eintraege.sort()
+        plan.unbesetzt.sort()
+        return plan
+
+    def _verbessere(self, plan, zuteilung, belegung, wochenenden, darf, verhaeltnis):
+        # Lokale Verbesserung: Tage von stark zu schwach belasteten Mitarbeitern verschieben. Geber sind alle
+        # Mitarbeiter mit neu zugeteilten Tagen, vom am stärksten belasteten an; wer nur gebuchte Tage hat, gibt nichts ab.
+        for _ in range(self.MAX_VERBESSERUNGEN):
+            reihenfolge = sorted(zuteilung, key=verhaeltnis)
+            geber_liste = [mid for mid in reversed(reihenfolge) if zuteilung[mid]]
+            if not any(self._verschiebe_einen_tag(plan, geber, reihenfolge, zuteilung, belegung, wochenenden,
+                                                  darf, verhaeltnis)
+                       for geber in geber_liste):
+                return
+
+    @staticmethod
+    def _verschiebe_einen_tag(plan, geber, reihenfolge, zuteilung, belegung, wochenenden, darf, verhaeltnis):
+        # Verschiebt einen Tag des Gebers an den schwächsten Empfänger, bei dem sich der Abstand verringert
+        for empfaenger in reihenfolge:
+            abstand = verhaeltnis(geber) - verhaeltnis(empfaenger)
+            if abstand <= 0:
+                return False
+            for index, (ordinal, punkte) in enumerate(zuteilung[geber]):
+                neu = abs(verhaeltnis(geber, -punkte) - verhaeltnis(empfaenger, punkte))
+                if neu >= abstand:
+                    continue
+                belegung[ordinal].discard(geber)
+                if darf(empfaenger, ordinal):
+                    del zuteilung[geber][index]
+                    plan.ist[geber] -= punkte
+                    if ordinal % 7 in (6, 0):
+                        partner = ordinal + 1 if ordinal % 7 == 6 else ordinal - 1
+                        if geber not in belegung.get(partner, ()):
+                            wochenenden[geber].discard(wochenende_nummer(ordinal))
+                    belegung[ordinal].add(empfaenger)
+                    if ordinal % 7 in (6, 0):
+                        wochenenden[empfaenger].add(wochenende_nummer(ordinal))
+                    plan.ist[empfaenger] += punkte
+                    zuteilung[empfaenger].append((ordinal, punkte))
+                    return True
+                belegung[ordinal].add(geber)
+        return False
+
+    def speichere(self, plan):
+        # Alle neuen Einträge in einer Transaktion schreiben
+        return self.db.fuege_kalender_eintraege_hinzu(plan.neue_eintraege)
@@ -0,0 +1,93 @@
+import logging
+import weakref
+from dataclasses import dataclass, field
+
+from datensaetze import Mitarbeiter
+
+logger = logging.getLogger(__name__)
+
+
+# Änderungsereignisse der Datenbank (ohne Qt nutzbar). Abonnenten können auch eine Basisklasse
+# abonnieren, z.B. KalenderEreignis für alle Änderungen an Einträgen.
+
+@dataclass(frozen=True)
+class MitarbeiterEreignis:
+    mitarbeiter_id: int
+
+
+@dataclass(frozen=True)
+class MitarbeiterHinzugefuegt(MitarbeiterEreignis):
+    mitarbeiter: Mitarbeiter = field(compare=False)
+
+
+@dataclass(frozen=True)
+class MitarbeiterGeaendert(MitarbeiterEreignis):
+    mitarbeiter: Mitarbeiter = field(compare=False)
+
+
+@dataclass(frozen=True)
+class MitarbeiterGeloescht(MitarbeiterEreignis):
+    pass
+
+
+@dataclass(frozen=True)
+class KalenderEreignis:
+    daten: frozenset  # betroffene Tage (datetime.date)
+
+
+@dataclass(frozen=True)
+class EintraegeHinzugefuegt(KalenderEreignis):
+    pass
+
+
+@dataclass(frozen=True)
+class EintraegeEntfernt(KalenderEreignis):
+    pass
+
+
+@dataclass(frozen=True)
+class EintraegeGeaendert(KalenderEreignis):
+    pass
+
+
+@dataclass(frozen=True)
+class EintraegeVorgemerkt:
+    # Änderung im Schreibjournal (journal.py), noch nicht in der Datenbank. Bewusst kein
+    # KalenderEreignis: Auswertungen aus der Datenbank warten auf das Ereignis nach dem Schreiben.
+    daten: frozenset
+
+
+class EreignisBus:
+    # Gebundene Methoden werden nur schwach referenziert, damit ein abonniertes Widget nicht
+    # durch den Bus am Leben gehalten wird. Zustellung erfolgt synchron im aufrufenden Thread.
+    def __init__(self):
+        self._abonnenten = {}  # Ereignisklasse -> Liste von Referenzen
+
+    @staticmethod
+    def _referenz(rueckruf):
+        if hasattr(rueckruf, "__self__"):
+            return weakref.WeakMethod(rueckruf)
+        return lambda: rueckruf
+
+    def abonniere(self, ereignis_typ, rueckruf):
+        self._abonnenten.setdefault(ereignis_typ, []).append(self._referenz(rueckruf))
+
+    def kuendige(self, ereignis_typ, rueckruf):
+        self._abonnenten[ereignis_typ] = [
+            referenz for referenz in self._abonnenten.get(ereignis_typ, []) if referenz() not in (None, rueckruf)
+        ]
+
+    def veroeffentliche(self, ereignis):
+        for klasse in type(ereignis).__mro__:
+            referenzen = self._abonnenten.get(klasse)
+            if not referenzen:
+                continue
+            for referenz in list(referenzen):
+                rueckruf = referenz()
+                if rueckruf is None:
+                    referenzen.remove(referenz)
+                    continue
+                try:
+                    rueckruf(ereignis)
+                except Exception:
+                    logger.exception("Fehler in Abonnent %r für %s", rueckruf, type(ereignis).__name__)
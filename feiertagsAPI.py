@@ -1,41 +1,302 @@
-import requests
-from datetime import datetime
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, timedelta
+
+from messung import Messung
+
+logger = logging.getLogger(__name__)
+
 
 class FeiertageAPI:
     BASE_URL = 'https://feiertage-api.de/api/'
     LAND_NRW = 'NW'
 
+    # Feste Feiertage je Land: (Name, Monat, Tag)
+    FESTE_FEIERTAGE = {
+        LAND_NRW: [
+            ('Neujahrstag', 1, 1),
+            ('Tag der Arbeit', 5, 1),
+            ('Tag der Deutschen Einheit', 10, 3),
+            ('Allerheiligen', 11, 1),
+            ('1. Weihnachtstag', 12, 25),
+            ('2. Weihnachtstag', 12, 26),
+        ],
+    }
+
+    # Bewegliche Feiertage je Land: (Name, Abstand in Tagen zum Ostersonntag)
+    BEWEGLICHE_FEIERTAGE = {
+        LAND_NRW: [
+            ('Karfreitag', -2),
+            ('Ostermontag', 1),
+            ('Christi Himmelfahrt', 39),
+            ('Pfingstmontag', 50),
+            ('Fronleichnam', 60),
+        ],
+    }
+
+    MAX_PARALLELE_ABFRAGEN = 4
+
+    # Lesen ohne Sperre (Einträge werden nur vollständig eingesetzt), Schreiben unter _sperre
     _cache = {}
+    _index = {}
+    _ungespeichert = {}  # (jahr, land) -> (daten, quelle): berechnet/geladen, aber noch nicht in der DB
+    _stand = 0
+    _datenbank = None
+    _datenbank_thread = None
+    _session = None
+    _sperre = threading.Lock()
 
     @classmethod
-    def get_feiertage_von_land(cls, jahr):
-        cache_key = f'feiertage_{jahr}_{cls.LAND_NRW}'
-        if cache_key in cls._cache:
-            return cls._cache[cache_key]
+    def setze_datenbank(cls, datenbank):
+        # Persistenter Cache: berechnete Feiertage landen in der Tabelle 'feiertage'
+        with cls._sperre:
+            cls._datenbank = datenbank
+            # SQLite-Verbindungen dürfen nur in ihrem eigenen Thread benutzt werden
+            cls._datenbank_thread = threading.get_ident()
+            cls._cache.clear()
+            cls._index.clear()
+            cls._ungespeichert.clear()
+            cls._stand += 1
+
+    @classmethod
+    def speichere_vorgeladene(cls):
+        # Feiertage, die ohne Schreibzugriff ermittelt wurden (Vorladen, Ansichten im GUI-Thread),
+        # über die registrierte Verbindung speichern; nur in deren Thread, z.B. beim Beenden
+        datenbank = cls._datenbank_im_thread()
+        if datenbank is None:
+            return
+        with cls._sperre:
+            offen, cls._ungespeichert = cls._ungespeichert, {}
+        if not offen:
+            return
+        try:
+            with datenbank.transaktion():
+                for (jahr, land), (data, quelle) in offen.items():
+                    datenbank.speichere_feiertage(jahr, land, data, quelle)
+        except Exception:
+            logger.exception("%d vorgeladene Feiertagsjahre konnten nicht gespeichert werden", len(offen))
+
+    @classmethod
+    def _datenbank_im_thread(cls):
+        if cls._datenbank is not None and threading.get_ident() == cls._datenbank_thread:
+            return cls._datenbank
+        return None
+
+    @classmethod
+    def _http_session(cls):
+        # Gemeinsame Session: Verbindungen zu feiertage-api.de werden wiederverwendet
+        if cls._session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            with cls._sperre:
+                if cls._session is None:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=cls.MAX_PARALLELE_ABFRAGEN)
+                    session.mount('https://', adapter)
+                    cls._session = session
+        return cls._session
+
+    @classmethod
+    def datenstand(cls):
+        # Wird erhöht, sobald sich bereits geladene Feiertagsdaten ändern können
+        return cls._stand
+
+    @staticmethod
+    def berechne_ostersonntag(jahr):
+        # Gaußsche Osterformel (gregorianischer Kalender, anonymer Algorithmus)
+        a = jahr % 19
+        b, c = divmod(jahr, 100)
+        d, e = divmod(b, 4)
+        f = (b + 8) // 25
+        g = (b - f + 1) // 3
+        h = (19 * a + b - d - g + 15) % 30
+        i, k = divmod(c, 4)
+        l = (32 + 2 * e + 2 * i - h - k) % 7
+        m = (a + 11 * h + 22 * l) // 451
+        monat, tag = divmod(h + l - 7 * m + 114, 31)
+        return date(jahr, monat, tag + 1)
+
+    @classmethod
+    def kann_lokal_berechnen(cls, land):
+        return land in cls.FESTE_FEIERTAGE
+
+    @classmethod
+    def berechne_feiertage(cls, jahr, land=LAND_NRW):
+        # Liefert dasselbe Format wie die feiertage-api.de: {name: {'datum': 'YYYY-MM-DD', 'hinweis': ''}}
+        if not cls.kann_lokal_berechnen(land):
+            raise ValueError(f"Keine lokale Feiertagsberechnung für Land '{land}' vorhanden")
+
+        feiertage = {}
+        for name, monat, tag in cls.FESTE_FEIERTAGE[land]:
+            feiertage[name] = {'datum': date(jahr, monat, tag).isoformat(), 'hinweis': ''}
+
+        ostersonntag = cls.berechne_ostersonntag(jahr)
+        for name, abstand in cls.BEWEGLICHE_FEIERTAGE[land]:
+            feiertage[name] = {'datum': (ostersonntag + timedelta(days=abstand)).isoformat(), 'hinweis': ''}
+
+        return dict(sorted(feiertage.items(), key=lambda eintrag: eintrag[1]['datum']))
 
+    @classmethod
+    def lade_feiertage_von_api(cls, jahr, land=LAND_NRW):
         params = {
             'jahr': jahr,
-            'nur_land': cls.LAND_NRW
+            'nur_land': land
         }
-        response = requests.get(cls.BASE_URL, params=params, timeout=5)
+        response = cls._http_session().get(cls.BASE_URL, params=params, timeout=5)
         response.raise_for_status()
-        data = response.json()
-        cls._cache[cache_key] = data
-        return data
+        return response.json()
 
     @classmethod
-    def is_feiertag_in_land(cls, datum):
-        # datum im Format 'YYYY-MM-DD'
+    def get_feiertage_von_land(cls, jahr, land=LAND_NRW, speichern=True):
+        # speichern=False: nicht über die Verbindung schreiben (kann bei gesperrter DB warten),
+        # sondern für speichere_vorgeladene() vormerken
+        cache_key = f'feiertage_{jahr}_{land}'
+        if cache_key in cls._cache:
+            if Messung.AKTIV:
+                Messung.zaehle("feiertage.cache.treffer")
+            return cls._cache[cache_key]
+        if Messung.AKTIV:
+            Messung.zaehle("feiertage.cache.fehlgriff")
+
+        datenbank = cls._datenbank_im_thread()
+        data = None
+        if datenbank is not None:
+            data = datenbank.lade_feiertage(jahr, land)
+            if data and Messung.AKTIV:
+                Messung.zaehle("feiertage.quelle.datenbank")
+
+        if not data:
+            if cls.kann_lokal_berechnen(land):
+                data, quelle = cls.berechne_feiertage(jahr, land), 'lokal'
+            else:
+                data, quelle = cls.lade_feiertage_von_api(jahr, land), 'api'
+            if Messung.AKTIV:
+                Messung.zaehle(f"feiertage.quelle.{quelle}")
+            if datenbank is not None and speichern:
+                datenbank.speichere_feiertage(jahr, land, data, quelle)
+            else:
+                with cls._sperre:
+                    cls._ungespeichert.setdefault((jahr, land), (data, quelle))
+
+        with cls._sperre:
+            cls._cache.setdefault(cache_key, data)
+        return cls._cache[cache_key]
+
+    @classmethod
+    def vorladen(cls, jahre, laender=(LAND_NRW,)):
+        # Lädt alle fehlenden (Jahr, Land)-Kombinationen: zuerst aus der DB, dann lokal berechnet
+        # oder parallel über die API. Liest über eine eigene, lesende Verbindung (keine Migration, kein
+        # Schreiben), daher in jedem Thread nutzbar; Neues merkt speichere_vorgeladene() vor.
+        fehlend = [(jahr, land) for jahr in jahre for land in laender
+                   if f'feiertage_{jahr}_{land}' not in cls._cache]
+        if not fehlend:
+            return
+
+        datenbank = None
+        if cls._datenbank is not None and cls._datenbank.datei != ':memory:':
+            from datenbank import Datenbank
+            try:
+                datenbank = Datenbank(datei=cls._datenbank.datei, nur_lesen=True)
+            except Exception as e:
+                logger.warning("Vorladen der Feiertage ohne Datenbank: %s", e)
+
         try:
-            dt = datetime.strptime(datum, '%Y-%m-%d')
-        except ValueError:
-            raise ValueError("Datum muss im Format 'YYYY-MM-DD' sein")
+            geladen = {}
+            api_abfragen = []
+            for jahr, land in fehlend:
+                data = datenbank.lade_feiertage(jahr, land) if datenbank is not None else None
+                if data:
+                    geladen[(jahr, land)] = (data, None)
+                elif cls.kann_lokal_berechnen(land):
+                    geladen[(jahr, land)] = (cls.berechne_feiertage(jahr, land), 'lokal')
+                else:
+                    api_abfragen.append((jahr, land))
+
+            if api_abfragen:
+                with ThreadPoolExecutor(max_workers=cls.MAX_PARALLELE_ABFRAGEN,
+                                        thread_name_prefix='feiertage') as pool:
+                    auftraege = {pool.submit(cls.lade_feiertage_von_api, jahr, land): (jahr, land)
+                                 for jahr, land in api_abfragen}
+                    for auftrag in as_completed(auftraege):
+                        jahr, land = auftraege[auftrag]
+                        try:
+                            geladen[(jahr, land)] = (auftrag.result(), 'api')
+                        except Exception as e:
+                            logger.warning("Feiertage %s/%s konnten nicht geladen werden: %s", jahr, land, e)
+
+            with cls._sperre:
+                for (jahr, land), (data, quelle) in geladen.items():
+                    cls._cache.setdefault(f'feiertage_{jahr}_{land}', data)
+                    if quelle is not None:
+                        cls._ungespeichert.setdefault((jahr, land), (data, quelle))
+
+            for jahr, land in geladen:
+                cls.feiertags_index(jahr, land)
+        finally:
+            if datenbank is not None:
+                datenbank.schliesse_verbindung()
 
-        feiertage = cls.get_feiertage_von_land(dt.year)
-        for feiertag in feiertage.values():
-            if feiertag['datum'] == datum:
-                return True
-        return False
+    @classmethod
+    def vorladen_im_hintergrund(cls, jahre, laender=(LAND_NRW,)):
+        def ausfuehren():
+            try:
+                cls.vorladen(jahre, laender)
+            except Exception:
+                logger.exception("Vorladen der Feiertage fehlgeschlagen")
+
+        thread = threading.Thread(target=ausfuehren, name='feiertage-vorladen', daemon=True)
+        thread.start()
+        return thread
+
+    @classmethod
+    def verifiziere_mit_api(cls, jahr, land=LAND_NRW, uebernehmen=False):
+        # Optionaler Abgleich der lokalen Daten mit feiertage-api.de.
+        # Rückgabe: (nur lokal, nur API) als sortierte Listen von 'YYYY-MM-DD'
+        lokal = cls.get_feiertage_von_land(jahr, land)
+        api = cls.lade_feiertage_von_api(jahr, land)
+
+        lokale_daten = {f['datum'] for f in lokal.values()}
+        api_daten = {f['datum'] for f in api.values()}
+        nur_lokal = sorted(lokale_daten - api_daten)
+        nur_api = sorted(api_daten - lokale_daten)
+
+        if uebernehmen and (nur_lokal or nur_api):
+            datenbank = cls._datenbank_im_thread()
+            if datenbank is not None:
+                datenbank.speichere_feiertage(jahr, land, api, 'api')
+            with cls._sperre:
+                cls._cache[f'feiertage_{jahr}_{land}'] = api
+                cls._index.pop((jahr, land), None)
+                cls._stand += 1
+
+        return nur_lokal, nur_api
+
+    @classmethod
+    def feiertags_index(cls, jahr, land=LAND_NRW, speichern=True):
+        # Menge der Tagesordinalzahlen (date.toordinal) aller Feiertage eines Jahres
+        schluessel = (jahr, land)
+        index = cls._index.get(schluessel)
+        if Messung.AKTIV:
+            Messung.zaehle("feiertage.index.treffer" if index is not None else "feiertage.index.fehlgriff")
+        if index is None:
+            feiertage = cls.get_feiertage_von_land(jahr, land, speichern)
+            index = frozenset(date.fromisoformat(f['datum']).toordinal() for f in feiertage.values())
+            with cls._sperre:
+                index = cls._index.setdefault(schluessel, index)
+        return index
+
+    @classmethod
+    def is_feiertag_in_land(cls, datum, land=LAND_NRW):
+        # datum als datetime.date/datetime oder im Format 'YYYY-MM-DD'
+        if isinstance(datum, str):
+            try:
+                datum = date.fromisoformat(datum)
+            except ValueError:
+                raise ValueError("Datum muss im Format 'YYYY-MM-DD' sein")
+
+        return datum.toordinal() in cls.feiertags_index(datum.year, land)
 
 
 # Beispielnutzung:
@@ -48,3 +309,6 @@ if __name__ == "__main__":
 
     datum_test = '2025-10-03'
     print(f"Ist {datum_test} ein Feiertag in NRW? {FeiertageAPI.is_feiertag_in_land(datum_test)}")
+
+    nur_lokal, nur_api = FeiertageAPI.verifiziere_mit_api(jahr)
+    print(f"Abgleich mit feiertage-api.de: nur lokal {nur_lokal}, nur API {nur_api}")
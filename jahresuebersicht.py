@@ -0,0 +1,238 @@
+import logging
+from array import array
+from datetime import date, timedelta
+
+from PyQt5.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QToolTip
+from PyQt5.QtCore import QDate, QEvent, QRectF, Qt, QTimer, pyqtSignal
+from PyQt5.QtGui import QColor, QPainter, QPen
+
+from ereignisse import EintraegeVorgemerkt, KalenderEreignis, MitarbeiterEreignis
+from feiertagsAPI import FeiertageAPI
+from journal import Schreibjournal
+from messung import gemessen
+
+logger = logging.getLogger(__name__)
+
+MONATSNAMEN = ["Jan", "Feb", "Mär", "Apr", "Mai", "Jun", "Jul", "Aug", "Sep", "Okt", "Nov", "Dez"]
+
+
+class JahresHeatmap(QWidget):
+    # Zeichnet die Besetzung eines ganzen Jahres (12 Monatszeilen x 31 Tage) in einem einzigen paintEvent.
+    # Je Tag des Jahres liegen die eingetragenen Mitarbeiter kompakt in zwei Arrays:
+    # mitarbeiter_ids[versatz[i]:versatz[i + 1]] sind die Mitarbeiter am i-ten Tag des Jahres.
+    tag_gewaehlt = pyqtSignal(QDate)
+
+    RAND_LINKS = 40
+    RAND_OBEN = 18
+    MAX_STREIFEN = 4  # mehr Mitarbeiter an einem Tag: Streifen der ersten vier plus Anzahl
+    FARBE_LEER = QColor("#eeeeee")
+    FARBE_FREI = QColor("#d4d4d4")  # Wochenende und Feiertag ohne Besetzung
+    FARBE_FEIERTAG = QColor("#c0392b")
+
+    def __init__(self):
+        super().__init__()
+        self.setMouseTracking(True)
+        self.setMinimumSize(560, 260)
+        self.setze_daten(date.today().year, array("I", [0] * 367), array("I"), {}, {}, frozenset())
+
+    def setze_daten(self, jahr, versatz, mitarbeiter_ids, farben, namen, feiertage):
+        self.jahr = jahr
+        self.erster_tag = date(jahr, 1, 1).toordinal()
+        self.versatz = versatz
+        self.mitarbeiter_ids = mitarbeiter_ids
+        self.farben = {mid: QColor(farbe) for mid, farbe in farben.items()}
+        self.namen = namen
+        self.feiertage = feiertage  # Ordinalzahlen, siehe FeiertageAPI.feiertags_index
+        self.update()
+
+    def mitarbeiter_am(self, datum):
+        i = datum.toordinal() - self.erster_tag
+        return self.mitarbeiter_ids[self.versatz[i]:self.versatz[i + 1]]
+
+    def zellengroesse(self):
+        return ((self.width() - self.RAND_LINKS) / 31, (self.height() - self.RAND_OBEN) / 12)
+
+    def datum_an(self, position):
+        breite, hoehe = self.zellengroesse()
+        spalte = int((position.x() - self.RAND_LINKS) // breite)
+        zeile = int((position.y() - self.RAND_OBEN) // hoehe)
+        if not (0 <= spalte < 31 and 0 <= zeile < 12) or position.x() < self.RAND_LINKS \
+                or position.y() < self.RAND_OBEN:
+            return None
+        try:
+            return date(self.jahr, zeile + 1, spalte + 1)
+        except ValueError:
+            return None  # z.B. 30. Februar
+
+    @gemessen()
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), self.palette().base())
+        breite, hoehe = self.zellengroesse()
+        abstand = 1 if min(breite, hoehe) > 6 else 0
+
+        painter.setPen(self.palette().text().color())
+        for spalte in range(0, 31, 5 if breite < 18 else 1):
+            painter.drawText(QRectF(self.RAND_LINKS + spalte * breite, 0, breite, self.RAND_OBEN),
+                             Qt.AlignCenter, str(spalte + 1))
+        for zeile, monatsname in enumerate(MONATSNAMEN):
+            painter.drawText(QRectF(0, self.RAND_OBEN + zeile * hoehe, self.RAND_LINKS - 4, hoehe),
+                             Qt.AlignRight | Qt.AlignVCenter, monatsname)
+
+        feiertag_stift = QPen(self.FARBE_FEIERTAG)
+        feiertag_stift.setWidth(2)
+        tag = date(self.jahr, 1, 1)
+        eins = timedelta(days=1)
+        for i in range(len(self.versatz) - 1):
+            if tag.year != self.jahr:
+                break
+            zelle = QRectF(self.RAND_LINKS + (tag.day - 1) * breite + abstand,
+                           self.RAND_OBEN + (tag.month - 1) * hoehe + abstand,
+                           breite - 2 * abstand, hoehe - 2 * abstand)
+            feiertag = tag.toordinal() in self.feiertage
+            von, bis = self.versatz[i], self.versatz[i + 1]
+            if von == bis:
+                painter.fillRect(zelle, self.FARBE_FREI if feiertag or tag.weekday() >= 5 else self.FARBE_LEER)
+            else:
+                # Mehrfach besetzte Tage als senkrechte Streifen in den Farben der Mitarbeiter
+                streifen = min(bis - von, self.MAX_STREIFEN)
+                streifenbreite = zelle.width() / streifen
+                for s in range(streifen):
+                    farbe = self.farben.get(self.mitarbeiter_ids[von + s], Qt.white)
+                    painter.fillRect(QRectF(zelle.x() + s * streifenbreite, zelle.y(), streifenbreite, zelle.height()),
+                                     farbe)
+                if bis - von > self.MAX_STREIFEN:
+                    painter.setPen(Qt.black)
+                    painter.setBackground(Qt.white)
+                    painter.setBackgroundMode(Qt.OpaqueMode)
+                    painter.drawText(zelle, Qt.AlignCenter, str(bis - von))
+                    painter.setBackgroundMode(Qt.TransparentMode)
+            if feiertag:
+                painter.setPen(feiertag_stift)
+                painter.drawRect(zelle.adjusted(1, 1, -1, -1))
+            tag += eins
+        painter.end()
+
+    def event(self, event):
+        if event.type() == QEvent.ToolTip:
+            datum = self.datum_an(event.pos())
+            if datum is None:
+                QToolTip.hideText()
+                event.ignore()
+            else:
+                QToolTip.showText(event.globalPos(), self.beschreibe(datum), self)
+            return True
+        return super().event(event)
+
+    def beschreibe(self, datum):
+        text = datum.strftime("%d.%m.%Y")
+        if datum.toordinal() in self.feiertage:
+            text += " (Feiertag)"
+        mitarbeiter = self.mitarbeiter_am(datum)
+        if not mitarbeiter:
+            return text + "\nNicht besetzt"
+        return text + "\n" + "\n".join(self.namen.get(mid, "?") for mid in mitarbeiter)
+
+    def mousePressEvent(self, event):
+        datum = self.datum_an(event.pos())
+        if event.button() == Qt.LeftButton and datum is not None:
+            self.tag_gewaehlt.emit(QDate(datum))
+        super().mousePressEvent(event)
+
+
+class JahresuebersichtWidget(QWidget):
+    # Jahresüberblick über die Rufbereitschaft; ausgeblendet wird bei Änderungen nur als veraltet markiert
+    def __init__(self, db, journal=None):
+        super().__init__()
+        self.db = db
+        self.journal = journal if journal is not None else Schreibjournal(db, self)
+        self.jahr = date.today().year
+        self.veraltet = True
+        self.setLayout(QVBoxLayout())
+
+        navigation = QHBoxLayout()
+        self.btn_zurueck = QPushButton("◀")
+        self.btn_zurueck.clicked.connect(lambda: self.zeige_jahr(self.jahr - 1))
+        self.jahr_label = QLabel()
+        self.jahr_label.setAlignment(Qt.AlignCenter)
+        self.btn_vor = QPushButton("▶")
+        self.btn_vor.clicked.connect(lambda: self.zeige_jahr(self.jahr + 1))
+        navigation.addWidget(self.btn_zurueck)
+        navigation.addWidget(self.jahr_label, 1)
+        navigation.addWidget(self.btn_vor)
+        self.layout().addLayout(navigation)
+
+        self.heatmap = JahresHeatmap()
+        self.heatmap.tag_gewaehlt.connect(self.tag_gewaehlt)
+        self.layout().addWidget(self.heatmap, 1)
+
+        self.status_label = QLabel()
+        self.layout().addWidget(self.status_label)
+
+        # Mehrere Ereignisse hintereinander (z.B. automatisch planen) führen zu einem einzigen Neuladen
+        self.neu_laden = QTimer(self)
+        self.neu_laden.setSingleShot(True)
+        self.neu_laden.setInterval(0)
+        self.neu_laden.timeout.connect(self.lade)
+
+        self.db.ereignisse.abonniere(MitarbeiterEreignis, self.daten_geaendert)
+        self.db.ereignisse.abonniere(KalenderEreignis, self.daten_geaendert)
+        self.db.ereignisse.abonniere(EintraegeVorgemerkt, self.daten_geaendert)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        if self.veraltet:
+            self.lade()
+
+    def zeige_jahr(self, jahr):
+        self.jahr = jahr
+        self.lade()
+
+    def daten_geaendert(self, ereignis):
+        daten = getattr(ereignis, "daten", None)
+        if daten is not None and not any(datum.year == self.jahr for datum in daten):
+            return
+        self.veraltet = True
+        if self.isVisible():
+            self.neu_laden.start()
+
+    @gemessen()
+    def lade(self):
+        self.veraltet = False
+        erster, letzter = date(self.jahr, 1, 1), date(self.jahr, 12, 31)
+        mitarbeiter = self.db.lade_mitarbeiter()
+        farben = {m.mitarbeiter_id: m.farbe if m.farbe and isinstance(m.farbe, str) else "#FFFFFF"
+                  for m in mitarbeiter}
+        namen = {m.mitarbeiter_id: m.name for m in mitarbeiter}
+
+        gelesen = {}
+        for eintrag in self.db.iteriere_kalender_eintraege(erster, letzter):
+            gelesen.setdefault(eintrag.datum, []).append(eintrag)
+        self.journal.ueberlagere(gelesen, erster, letzter, lambda mid: namen.get(mid, ""))
+
+        tage = (letzter - erster).days + 1
+        versatz = array("I", [0])
+        mitarbeiter_ids = array("I")
+        besetzt = mehrfach = 0
+        for i in range(tage):
+            eintraege = gelesen.get(erster + timedelta(days=i), ())
+            mitarbeiter_ids.extend(eintrag.mitarbeiter_id for eintrag in eintraege)
+            versatz.append(len(mitarbeiter_ids))
+            besetzt += bool(eintraege)
+            mehrfach += len(eintraege) > 1
+
+        try:
+            # Nicht über die GUI-Verbindung schreiben: das könnte auf die Schreibsperre des Soll/Ist-Auftrags warten
+            feiertage = FeiertageAPI.feiertags_index(self.jahr, speichern=False)
+        except Exception:
+            logger.exception("Feiertage %d konnten nicht geladen werden", self.jahr)
+            feiertage = frozenset()
+
+        self.heatmap.setze_daten(self.jahr, versatz, mitarbeiter_ids, farben, namen, feiertage)
+        self.jahr_label.setText(f"<b>{self.jahr}</b>")
+        self.status_label.setText(f"{besetzt} von {tage} Tagen besetzt, davon {mehrfach} mehrfach; "
+                                  f"{tage - besetzt} Tage ohne Rufbereitschaft.")
+
+    def tag_gewaehlt(self, datum):
+        self.status_label.setText(self.heatmap.beschreibe(datum.toPyDate()).replace("\n", " – ", 1)
+                                  .replace("\n", ", "))
@@ -0,0 +1,122 @@
+import logging
+from dataclasses import dataclass
+
+from PyQt5.QtCore import QObject, QTimer
+
+from datensaetze import KalenderEintrag
+from ereignisse import EintraegeVorgemerkt, MitarbeiterGeloescht
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True, slots=True)
+class Operation:
+    hinzufuegen: bool  # False = entfernen
+    datum: object      # datetime.date
+    mitarbeiter_id: int
+
+    def umgekehrt(self):
+        return Operation(not self.hinzufuegen, self.datum, self.mitarbeiter_id)
+
+
+class Schreibjournal(QObject):
+    # Write-behind für Kalendereinträge: Änderungen wirken sofort in der Ansicht (EintraegeVorgemerkt)
+    # und werden gesammelt in einer Transaktion geschrieben, spätestens VERZOEGERUNG_MS nach der ersten
+    # offenen Änderung. Je (Tag, Mitarbeiter) zählt nur der letzte Stand, Hin und Zurück hebt sich auf.
+    # Rückgängig/Wiederholen arbeitet auch über bereits geschriebene Änderungen hinweg.
+    VERZOEGERUNG_MS = 500
+    MAX_AUSSTEHEND = 500   # ab so vielen offenen Änderungen sofort schreiben
+    MAX_RUECKGAENGIG = 200
+
+    def __init__(self, db, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self.ausstehend = {}  # (datum, mitarbeiter_id) -> True (eintragen) / False (entfernen)
+        self.rueckgaengig_stapel = []
+        self.wiederholen_stapel = []
+
+        self.zeitgeber = QTimer(self)
+        self.zeitgeber.setSingleShot(True)
+        self.zeitgeber.setInterval(self.VERZOEGERUNG_MS)
+        self.zeitgeber.timeout.connect(self.schreibe)
+
+        self.db.ereignisse.abonniere(MitarbeiterGeloescht, self.mitarbeiter_geloescht)
+
+    def hinzufuegen(self, datum, mitarbeiter_id):
+        self.ausfuehren(Operation(True, datum, mitarbeiter_id))
+
+    def entfernen(self, datum, mitarbeiter_id):
+        self.ausfuehren(Operation(False, datum, mitarbeiter_id))
+
+    def ausfuehren(self, operation):
+        self._anwenden(operation)
+        self.rueckgaengig_stapel.append(operation)
+        del self.rueckgaengig_stapel[:-self.MAX_RUECKGAENGIG]
+        self.wiederholen_stapel.clear()
+
+    def rueckgaengig(self):
+        # Liefert die zurückgenommene Operation oder None
+        if not self.rueckgaengig_stapel:
+            return None
+        operation = self.rueckgaengig_stapel.pop()
+        self._anwenden(operation.umgekehrt())
+        self.wiederholen_stapel.append(operation)
+        return operation
+
+    def wiederholen(self):
+        if not self.wiederholen_stapel:
+            return None
+        operation = self.wiederholen_stapel.pop()
+        self._anwenden(operation)
+        self.rueckgaengig_stapel.append(operation)
+        return operation
+
+    def _anwenden(self, operation):
+        self.ausstehend[(operation.datum, operation.mitarbeiter_id)] = operation.hinzufuegen
+        self.db.ereignisse.veroeffentliche(EintraegeVorgemerkt(frozenset([operation.datum])))
+        if len(self.ausstehend) >= self.MAX_AUSSTEHEND:
+            self.schreibe()
+        elif not self.zeitgeber.isActive():
+            self.zeitgeber.start()
+
+    def ueberlagere(self, eintraege_je_tag, von, bis, name_fuer):
+        # Offene Änderungen im Zeitraum auf frisch gelesene Einträge (date -> Liste) anwenden
+        for (datum, mitarbeiter_id), hinzufuegen in self.ausstehend.items():
+            if not von <= datum <= bis:
+                continue
+            eintraege = eintraege_je_tag.setdefault(datum, [])
+            vorhanden = any(eintrag.mitarbeiter_id == mitarbeiter_id for eintrag in eintraege)
+            if hinzufuegen and not vorhanden:
+                eintraege.append(KalenderEintrag(None, datum, mitarbeiter_id, name_fuer(mitarbeiter_id)))
+            elif not hinzufuegen and vorhanden:
+                eintraege[:] = [eintrag for eintrag in eintraege if eintrag.mitarbeiter_id != mitarbeiter_id]
+
+    def schreibe(self):
+        # Alle offenen Änderungen in einer Transaktion schreiben; False, wenn das nicht gelang
+        self.zeitgeber.stop()
+        if not self.ausstehend:
+            return True
+        ausstehend, self.ausstehend = self.ausstehend, {}
+        try:
+            self.db.wende_kalender_aenderungen_an(
+                [schluessel for schluessel, hinzufuegen in ausstehend.items() if hinzufuegen],
+                [schluessel for schluessel, hinzufuegen in ausstehend.items() if not hinzufuegen],
+            )
+        except Exception:
+            logger.exception("%d vorgemerkte Kalenderänderungen konnten nicht geschrieben werden", len(ausstehend))
+            # Zurücklegen; inzwischen neu vorgemerkte Änderungen haben Vorrang
+            for schluessel, hinzufuegen in ausstehend.items():
+                self.ausstehend.setdefault(schluessel, hinzufuegen)
+            self.zeitgeber.start()
+            return False
+        return True
+
+    def mitarbeiter_geloescht(self, ereignis):
+        # Änderungen für den gelöschten Mitarbeiter verwerfen, auch in Rückgängig/Wiederholen
+        mid = ereignis.mitarbeiter_id
+        daten = frozenset(datum for datum, mitarbeiter_id in self.ausstehend if mitarbeiter_id == mid)
+        self.ausstehend = {schluessel: wert for schluessel, wert in self.ausstehend.items() if schluessel[1] != mid}
+        self.rueckgaengig_stapel = [op for op in self.rueckgaengig_stapel if op.mitarbeiter_id != mid]
+        self.wiederholen_stapel = [op for op in self.wiederholen_stapel if op.mitarbeiter_id != mid]
+        if daten:
+            self.db.ereignisse.veroeffentliche(EintraegeVorgemerkt(daten))
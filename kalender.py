@@ -1,136 +1,181 @@
-import sqlite3
-from datetime import datetime
+import logging
+from collections import OrderedDict
 from PyQt5.QtWidgets import (
-    QWidget, QVBoxLayout, QCalendarWidget, QLabel,
-    QDialog, QComboBox, QDialogButtonBox, QMessageBox
+    QWidget, QVBoxLayout, QHBoxLayout, QCalendarWidget, QLabel,
+    QDialog, QComboBox, QDialogButtonBox, QMessageBox, QPushButton,
+    QFormLayout, QDateEdit, QSpinBox, QShortcut
 )
-from PyQt5.QtCore import QDate
-from PyQt5.QtGui import QTextCharFormat, QColor
-
-
-class KalenderDB:
-    def __init__(self, db_datei='kalender.db'):
-        self.conn = sqlite3.connect(db_datei)
-        self.conn.row_factory = sqlite3.Row  # Für dict-ähnliche Ergebnisse
-        self.cursor = self.conn.cursor()
-
-        # Foreign Keys in SQLite aktivieren
-        self.cursor.execute("PRAGMA foreign_keys = ON;")
-
-        # Tabellen anlegen, falls nicht existieren
-        self.erstelle_tabellen()
-
-    def erstelle_tabellen(self):
-        self.cursor.execute("""
-        CREATE TABLE IF NOT EXISTS mitarbeiter (
-            mitarbeiter_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            mitarbeiter_vorname TEXT,
-            mitarbeiter_nachname TEXT,
-            mitarbeiter_eintritt TEXT,
-            mitarbeiter_farbe TEXT DEFAULT '#ffffff'
-        )
-        """)
-        self.cursor.execute("""
-        CREATE TABLE IF NOT EXISTS kalender_mitarbeiter (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            datum TEXT NOT NULL,
-            mitarbeiter_id INTEGER NOT NULL,
-            erstellt_am TEXT DEFAULT CURRENT_TIMESTAMP,
-            aktualisiert_am TEXT DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (mitarbeiter_id) REFERENCES mitarbeiter(mitarbeiter_id)
-        )
-        """)
-        self.conn.commit()
-
-    def lade_mitarbeiter(self):
-        self.cursor.execute("SELECT mitarbeiter_id, mitarbeiter_vorname, mitarbeiter_nachname, mitarbeiter_farbe FROM mitarbeiter")
-        return [dict(row) for row in self.cursor.fetchall()]
-
-    def lade_kalender_eintraege(self, datum_str):
-        # datum_str im Format 'YYYY-MM-DD'
-        self.cursor.execute("SELECT id, mitarbeiter_id FROM kalender_mitarbeiter WHERE datum = ?", (datum_str,))
-        return [dict(row) for row in self.cursor.fetchall()]
-
-    def fuege_kalender_eintrag_hinzu(self, datum_str, mitarbeiter_id):
-        self.cursor.execute(
-            "INSERT INTO kalender_mitarbeiter (datum, mitarbeiter_id) VALUES (?, ?)",
-            (datum_str, mitarbeiter_id)
-        )
-        self.conn.commit()
-
-    def loesche_kalender_eintrag(self, kalender_id):
-        self.cursor.execute("DELETE FROM kalender_mitarbeiter WHERE id = ?", (kalender_id,))
-        self.conn.commit()
-
-    def schliesse_verbindung(self):
-        self.cursor.close()
-        self.conn.close()
+from PyQt5.QtCore import QDate, Qt
+from PyQt5.QtGui import QTextCharFormat, QColor, QFont, QKeySequence
+
+from dienstplan import DienstplanGenerator
+from ereignisse import (
+    EintraegeVorgemerkt, KalenderEreignis, MitarbeiterGeaendert, MitarbeiterGeloescht, MitarbeiterHinzugefuegt,
+)
+from journal import Schreibjournal
+from messung import gemessen
+
+logger = logging.getLogger(__name__)
 
 
 class KalenderWidget(QWidget):
-    def __init__(self, db):
+    # Zusätzlich zur sichtbaren Seite geladene Monate davor/danach
+    MONATE_VORLADEN = 1
+    # Maximale Anzahl Monate im Speicher (LRU)
+    MAX_MONATE_IM_CACHE = 12
+    # Höchstzahl gemerkter Tagesformate, danach wird der Vorrat neu aufgebaut
+    MAX_FORMATE = 512
+
+    def __init__(self, db, journal=None):
         super().__init__()
         self.db = db
+        # Klicks landen im Schreibjournal; das Hauptfenster reicht sein eigenes herein und schreibt es beim Schließen
+        self.journal = journal if journal is not None else Schreibjournal(db, self)
         self.setLayout(QVBoxLayout())
 
         self.kalender = QCalendarWidget()
         self.kalender.setGridVisible(True)
         self.kalender.clicked.connect(self.tag_geklickt)
+        self.kalender.currentPageChanged.connect(self.seite_gewechselt)
         self.layout().addWidget(self.kalender)
 
+        status_layout = QHBoxLayout()
         self.status_label = QLabel("Wähle ein Datum.")
-        self.layout().addWidget(self.status_label)
-
-        # Mitarbeiter laden inkl. Farbe
-        self.mitarbeiter_liste = self.db.lade_mitarbeiter()
-
-        # Dict: mitarbeiter_id -> Farbe (hex string)
-        self.mitarbeiter_farben = {}
-        for m in self.mitarbeiter_liste:
-            farbe = m.get("mitarbeiter_farbe")
-            if farbe and isinstance(farbe, str):
-                self.mitarbeiter_farben[m["mitarbeiter_id"]] = farbe
-            else:
-                self.mitarbeiter_farben[m["mitarbeiter_id"]] = "#FFFFFF"  # default weiß
+        status_layout.addWidget(self.status_label, 1)
+        self.btn_planen = QPushButton("Automatisch planen...")
+        self.btn_planen.clicked.connect(self.automatisch_planen)
+        status_layout.addWidget(self.btn_planen)
+        self.layout().addLayout(status_layout)
+
+        for tasten, aktion in ((QKeySequence.Undo, self.rueckgaengig), (QKeySequence.Redo, self.wiederholen)):
+            kuerzel = QShortcut(tasten, self, aktion)
+            kuerzel.setContext(Qt.WidgetWithChildrenShortcut)
+
+        # Mitarbeiter laden inkl. Farbe; danach über Ereignisse der Datenbank aktuell halten
+        self.mitarbeiter_liste = []
+        self.mitarbeiter_farben = {}  # mitarbeiter_id -> Farbe (hex string)
+        for m in self.db.lade_mitarbeiter():
+            self.mitarbeiter_setzen(m)
+
+        # Tagesformate je (Farbe, Namen): Tage mit gleicher Besetzung teilen sich ein QTextCharFormat
+        self.formate = {}
+        self.leeres_format = QTextCharFormat()
+        self.leeres_format.setBackground(QColor("white"))
+        self.leeres_format.setToolTip("")
 
         self.eintraege = {}
-
-        self.lade_alle_eintraege()
-
-    def lade_alle_eintraege(self):
+        # (jahr, monat) -> Liste der QDates mit Einträgen, in LRU-Reihenfolge
+        self.geladene_monate = OrderedDict()
+
+        self.db.ereignisse.abonniere(MitarbeiterHinzugefuegt, self.mitarbeiter_geaendert)
+        self.db.ereignisse.abonniere(MitarbeiterGeaendert, self.mitarbeiter_geaendert)
+        self.db.ereignisse.abonniere(MitarbeiterGeloescht, self.mitarbeiter_geloescht)
+        self.db.ereignisse.abonniere(KalenderEreignis, self.kalender_geaendert)
+        self.db.ereignisse.abonniere(EintraegeVorgemerkt, self.kalender_geaendert)
+
+        self.lade_eintraege_neu()
+
+    def mitarbeiter_setzen(self, mitarbeiter):
+        mid = mitarbeiter.mitarbeiter_id
+        self.mitarbeiter_liste = [m for m in self.mitarbeiter_liste if m.mitarbeiter_id != mid]
+        self.mitarbeiter_liste.append(mitarbeiter)
+        farbe = mitarbeiter.farbe
+        self.mitarbeiter_farben[mid] = farbe if farbe and isinstance(farbe, str) else "#FFFFFF"  # default weiß
+
+    def mitarbeiter_name(self, mitarbeiter_id):
+        for mitarbeiter in self.mitarbeiter_liste:
+            if mitarbeiter.mitarbeiter_id == mitarbeiter_id:
+                return mitarbeiter.name
+        return ""
+
+    def mitarbeiter_geaendert(self, ereignis):
+        self.mitarbeiter_setzen(ereignis.mitarbeiter)
+        # Name und Farbe nur an den Tagen nachziehen, an denen der Mitarbeiter eingetragen ist
+        name = ereignis.mitarbeiter.name
+        for datum, eintraege in self.eintraege.items():
+            betroffen = False
+            for eintrag in eintraege:
+                if eintrag.mitarbeiter_id == ereignis.mitarbeiter_id:
+                    eintrag.name = name
+                    betroffen = True
+            if betroffen:
+                self.update_tag_formatierung(datum)
+
+    def mitarbeiter_geloescht(self, ereignis):
+        # Die gelöschten Einträge kommen als eigenes EintraegeEntfernt-Ereignis
+        self.mitarbeiter_liste = [m for m in self.mitarbeiter_liste if m.mitarbeiter_id != ereignis.mitarbeiter_id]
+        self.mitarbeiter_farben.pop(ereignis.mitarbeiter_id, None)
+
+    def kalender_geaendert(self, ereignis):
+        # Nur geladene Monate nachziehen, je Monat den Bereich vom ersten bis zum letzten betroffenen Tag
+        betroffen = {}
+        for datum in ereignis.daten:
+            schluessel = (datum.year, datum.month)
+            if schluessel in self.geladene_monate:
+                betroffen.setdefault(schluessel, []).append(datum)
+        for schluessel, daten in betroffen.items():
+            self.lade_tage(schluessel, min(daten), max(daten))
+
+    @gemessen()
+    def lade_eintraege_neu(self):
+        # Verwirft alle geladenen Monate und lädt nur die sichtbare Seite samt Rand neu
+        for datum in list(self.eintraege):
+            self.kalender.setDateTextFormat(datum, QTextCharFormat())
         self.eintraege.clear()
-        # Korrigierte SQL mit String-Verkettung in SQLite
-        self.db.cursor.execute("""
-            SELECT k.id,
-                   k.datum,
-                   k.mitarbeiter_id,
-                   m.mitarbeiter_vorname || ' ' || m.mitarbeiter_nachname AS name
-            FROM kalender_mitarbeiter k
-            JOIN mitarbeiter m ON k.mitarbeiter_id = m.mitarbeiter_id
-        """)
-        daten = self.db.cursor.fetchall()
-
-        for eintrag in daten:
-            datum_str = eintrag["datum"]
-            # Datum als QDate parsen (aus String 'YYYY-MM-DD')
-            try:
-                datum_dt = datetime.strptime(datum_str, "%Y-%m-%d").date()
-                qdatum = QDate(datum_dt.year, datum_dt.month, datum_dt.day)
-            except Exception as e:
-                print(f"Fehler beim Parsen des Datums '{datum_str}': {e}")
-                continue
-
-            if qdatum not in self.eintraege:
-                self.eintraege[qdatum] = []
-
-            self.eintraege[qdatum].append({
-                "kalender_id": eintrag["id"],
-                "mitarbeiter_id": int(eintrag["mitarbeiter_id"]),
-                "name": eintrag["name"]
-            })
-
-        self.aktualisiere_alle_farbungen()
+        self.geladene_monate.clear()
+        self.seite_gewechselt(self.kalender.yearShown(), self.kalender.monthShown())
+
+    def seite_gewechselt(self, jahr, monat):
+        for abstand in range(-self.MONATE_VORLADEN, self.MONATE_VORLADEN + 1):
+            erster_tag = QDate(jahr, monat, 1).addMonths(abstand)
+            schluessel = (erster_tag.year(), erster_tag.month())
+            if schluessel in self.geladene_monate:
+                self.geladene_monate.move_to_end(schluessel)
+            else:
+                self.lade_monat(erster_tag)
+
+        while len(self.geladene_monate) > self.MAX_MONATE_IM_CACHE:
+            _, tage = self.geladene_monate.popitem(last=False)
+            for datum in tage:
+                self.eintraege.pop(datum, None)
+                self.kalender.setDateTextFormat(datum, QTextCharFormat())
+
+    def lade_monat(self, erster_tag):
+        letzter_tag = erster_tag.addMonths(1).addDays(-1)
+        self.lade_tage((erster_tag.year(), erster_tag.month()), erster_tag.toPyDate(), letzter_tag.toPyDate())
+
+    @gemessen()
+    def lade_tage(self, schluessel, von, bis):
+        # Liest die Tage von 'von' bis 'bis' (date, innerhalb des Monats 'schluessel') neu ein
+        tage = self.geladene_monate.setdefault(schluessel, [])
+        von_datum = QDate(von)
+        bis_datum = QDate(bis)
+        veraltet = [datum for datum in tage if von_datum <= datum <= bis_datum]
+        for datum in veraltet:
+            tage.remove(datum)
+            self.eintraege.pop(datum, None)
+
+        gelesen = {}
+        for eintrag in self.db.iteriere_kalender_eintraege(von, bis):
+            gelesen.setdefault(eintrag.datum, []).append(eintrag)
+        # Noch nicht geschriebene Änderungen aus dem Journal darüberlegen
+        self.journal.ueberlagere(gelesen, von, bis, self.mitarbeiter_name)
+
+        neu = []
+        for tag, eintraege in gelesen.items():
+            if eintraege:
+                qdatum = QDate(tag)
+                self.eintraege[qdatum] = eintraege
+                neu.append(qdatum)
+
+        tage.extend(neu)
+        for datum in veraltet:
+            if datum not in self.eintraege:
+                self.kalender.setDateTextFormat(datum, QTextCharFormat())
+        for datum in neu:
+            self.update_tag_formatierung(datum)
 
+    @gemessen()
     def aktualisiere_alle_farbungen(self):
         for datum in self.eintraege:
             self.update_tag_formatierung(datum)
@@ -146,39 +191,85 @@ class KalenderWidget(QWidget):
                 return
 
             eintraege_heute = self.eintraege.get(datum, [])
-            if any(e["mitarbeiter_id"] == mitarbeiter["mitarbeiter_id"] for e in eintraege_heute):
+            if any(e.mitarbeiter_id == mitarbeiter["mitarbeiter_id"] for e in eintraege_heute):
                 QMessageBox.information(self, "Hinweis", f"{mitarbeiter['name']} ist bereits eingetragen.")
                 return
 
-            datum_str = datum.toString("yyyy-MM-dd")
-            self.db.fuege_kalender_eintrag_hinzu(datum_str, mitarbeiter["mitarbeiter_id"])
-            self.lade_alle_eintraege()
+            # Sofort sichtbar (EintraegeVorgemerkt), geschrieben wird gesammelt im Hintergrund
+            self.journal.hinzufuegen(datum.toPyDate(), mitarbeiter["mitarbeiter_id"])
+            self.status_label.setText(
+                f"{mitarbeiter['name']} am {datum.toString('dd.MM.yyyy')} eingetragen (Strg+Z: rückgängig)")
+
+    def rueckgaengig(self):
+        operation = self.journal.rueckgaengig()
+        if operation is None:
+            self.status_label.setText("Nichts rückgängig zu machen.")
+            return
+        self.status_label.setText(f"Rückgängig: {self.beschreibe(operation)}")
+
+    def wiederholen(self):
+        operation = self.journal.wiederholen()
+        if operation is None:
+            self.status_label.setText("Nichts zu wiederholen.")
+            return
+        self.status_label.setText(f"Wiederholt: {self.beschreibe(operation)}")
+
+    def beschreibe(self, operation):
+        aktion = "eingetragen" if operation.hinzufuegen else "ausgetragen"
+        return f"{self.mitarbeiter_name(operation.mitarbeiter_id)} am {operation.datum:%d.%m.%Y} {aktion}"
+
+    def automatisch_planen(self):
+        erster_tag = QDate(self.kalender.yearShown(), self.kalender.monthShown(), 1)
+        dialog = DienstplanDialog(erster_tag, erster_tag.addMonths(1).addDays(-1))
+        if not dialog.exec_():
+            return
+
+        daten = dialog.get_data()
+        # Der Generator plant auf dem gespeicherten Stand, offene Klicks also vorher schreiben
+        self.journal.schreibe()
+        generator = DienstplanGenerator(self.db)
+        plan = generator.erzeuge(daten["start"], daten["ende"], pro_tag=daten["pro_tag"])
+        if not plan.neue_eintraege:
+            QMessageBox.information(self, "Hinweis", "Im gewählten Zeitraum sind keine Tage offen.")
+            return
+
+        anzahl = generator.speichere(plan)
+
+        meldung = f"{anzahl} Rufbereitschaften eingetragen."
+        if plan.unbesetzt:
+            meldung += f"\n{len(plan.unbesetzt)} Tage konnten nicht vollständig besetzt werden."
+        QMessageBox.information(self, "Dienstplan erstellt", meldung)
+
+    def format_fuer(self, farbe_hex, namen):
+        # Farbe des ersten Mitarbeiters; mehrfach besetzte Tage fett (alle Farben zeigt die Jahresübersicht)
+        schluessel = (farbe_hex, namen)
+        formatierung = self.formate.get(schluessel)
+        if formatierung is None:
+            if len(self.formate) >= self.MAX_FORMATE:
+                self.formate.clear()
+            farbe = QColor(farbe_hex)
+            if not farbe.isValid():
+                farbe = QColor("#FFFFFF")
+            formatierung = QTextCharFormat()
+            formatierung.setBackground(farbe)
+            if len(namen) > 1:
+                formatierung.setFontWeight(QFont.Bold)
+            formatierung.setToolTip("Mitarbeiter an diesem Tag:\n" + "\n".join(namen))
+            self.formate[schluessel] = formatierung
+        return formatierung
 
     def update_tag_formatierung(self, datum):
         try:
-            formatierung = QTextCharFormat()
-
-            if datum in self.eintraege and self.eintraege[datum]:
-                erster_mitarbeiter_id = self.eintraege[datum][0]["mitarbeiter_id"]
-
-                farbe_hex = self.mitarbeiter_farben.get(erster_mitarbeiter_id, "#FFFFFF")
-                farbe = QColor(farbe_hex)
-                if not farbe.isValid():
-                    farbe = QColor("#FFFFFF")
-
-                formatierung.setBackground(farbe)
-
-                namen = [e["name"] for e in self.eintraege[datum]]
-                tooltip_text = "Mitarbeiter an diesem Tag:\n" + "\n".join(namen)
-                formatierung.setToolTip(tooltip_text)
+            eintraege = self.eintraege.get(datum)
+            if eintraege:
+                farbe_hex = self.mitarbeiter_farben.get(eintraege[0].mitarbeiter_id, "#FFFFFF")
+                formatierung = self.format_fuer(farbe_hex, tuple(e.name for e in eintraege))
             else:
-                formatierung.setBackground(QColor("white"))
-                formatierung.setToolTip("")
-
+                formatierung = self.leeres_format
             self.kalender.setDateTextFormat(datum, formatierung)
 
-        except Exception as e:
-            print(f"Fehler bei update_tag_formatierung: {e}")
+        except Exception:
+            logger.exception("Fehler bei update_tag_formatierung")
 
 
 class EintragDialog(QDialog):
@@ -191,11 +282,10 @@ class EintragDialog(QDialog):
         self.mitarbeiter_combo = QComboBox()
         for m in mitarbeiter_liste:
             try:
-                if m["mitarbeiter_id"] is not None:
-                    name = f"{m['mitarbeiter_vorname']} {m['mitarbeiter_nachname']}"
-                    self.mitarbeiter_combo.addItem(name, m["mitarbeiter_id"])
-            except Exception as e:
-                print(f"Fehler beim Hinzufügen von Mitarbeiter: {e}")
+                if m.mitarbeiter_id is not None:
+                    self.mitarbeiter_combo.addItem(m.name, m.mitarbeiter_id)
+            except Exception:
+                logger.exception("Fehler beim Hinzufügen von Mitarbeiter")
 
         self.layout().addWidget(QLabel("Mitarbeiter:"))
         self.layout().addWidget(self.mitarbeiter_combo)
@@ -210,3 +300,35 @@ class EintragDialog(QDialog):
             "mitarbeiter_id": self.mitarbeiter_combo.currentData(),
             "name": self.mitarbeiter_combo.currentText()
         }
+
+
+class DienstplanDialog(QDialog):
+    def __init__(self, start, ende):
+        super().__init__()
+        self.setWindowTitle("Rufbereitschaft automatisch planen")
+        self.setMinimumWidth(300)
+        self.setLayout(QFormLayout())
+
+        self.start = QDateEdit(start)
+        self.start.setCalendarPopup(True)
+        self.ende = QDateEdit(ende)
+        self.ende.setCalendarPopup(True)
+        self.pro_tag = QSpinBox()
+        self.pro_tag.setRange(1, 10)
+        self.pro_tag.setValue(1)
+
+        self.layout().addRow("Von:", self.start)
+        self.layout().addRow("Bis:", self.ende)
+        self.layout().addRow("Personen pro Tag:", self.pro_tag)
+
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        self.layout().addWidget(buttons)
+
+    def get_data(self):
+        return {
+            "start": self.start.date().toPyDate(),
+            "ende": self.ende.date().toPyDate(),
+            "pro_tag": self.pro_tag.value()
+        }
@@ -1,15 +1,63 @@
-import sys
-from PyQt5.QtWidgets import QApplication, QMainWindow, QTabWidget
-from PyQt5.QtGui import QIcon
-from PyQt5.QtCore import Qt
-
-from kalender import KalenderWidget
-from mitarbeiter import MitarbeiterWidget
-from datenbank import Datenbank
-from sollistwidget import SollIstWidget
+from startprofil import StartProfil  # zuerst importieren: misst ab hier
+
+import logging
 import os
-from pathlib import Path
-from platformdirs import user_data_dir
+import sys
+from datetime import date
+from PyQt5.QtWidgets import QApplication, QMainWindow, QMessageBox, QShortcut, QTabWidget, QVBoxLayout, QWidget
+from PyQt5.QtGui import QIcon, QKeySequence
+from PyQt5.QtCore import Qt, QTimer
+
+from datenbank import Datenbank, daten_ordner, standard_datenbank_datei
+from feiertagsAPI import FeiertageAPI
+from journal import Schreibjournal
+from protokoll import richte_logging_ein, debug_aktiviert
+
+logger = logging.getLogger(__name__)
+
+
+class VerzoegerterTab(QWidget):
+    # Platzhalter, der das eigentliche Widget (samt Modulimport) erst beim ersten Anzeigen erzeugt
+    def __init__(self, name, erzeuge_widget):
+        super().__init__()
+        self.name = name
+        self.erzeuge_widget = erzeuge_widget
+        self.widget = None
+        self.setLayout(QVBoxLayout())
+        self.layout().setContentsMargins(0, 0, 0, 0)
+
+    def showEvent(self, event):
+        if self.widget is None:
+            with StartProfil.abschnitt(f"Tab {self.name}"):
+                self.widget = self.erzeuge_widget()
+                self.layout().addWidget(self.widget)
+        super().showEvent(event)
+
+
+def erzeuge_mitarbeiter_tab(db):
+    from mitarbeiter import MitarbeiterWidget
+    return MitarbeiterWidget(db)
+
+
+def erzeuge_kalender_tab(db, journal):
+    from kalender import KalenderWidget
+    return KalenderWidget(db, journal)
+
+
+def erzeuge_jahresuebersicht_tab(db, journal):
+    from jahresuebersicht import JahresuebersichtWidget
+    return JahresuebersichtWidget(db, journal)
+
+
+def erzeuge_soll_ist_tab(db):
+    from sollistwidget import SollIstWidget
+    return SollIstWidget(db)
+
+
+def erzeuge_diagnose_tab():
+    from diagnose import DiagnoseWidget
+    return DiagnoseWidget()
+
 
 class MainWindow(QMainWindow):
     def __init__(self):
@@ -17,29 +65,42 @@ class MainWindow(QMainWindow):
         self.setWindowTitle("Rufbereitschaft-Programm")
         self.setGeometry(100, 100, 1000, 700)
 
-        # Benutzer-spezifischen Datenordner bestimmen
-        app_name = "Rufbereitschaft"
-        app_author = "GahlenDevelopment"  # optional, unter Windows wird das als Unterordner genutzt
-        datenbank_ordner = Path(user_data_dir(app_name, app_author))
-        datenbank_ordner.mkdir(parents=True, exist_ok=True)
+        # Verbindung zur DB im Nutzerordner herstellen
+        self.db = Datenbank(datei=str(standard_datenbank_datei()))
+
+        # Kalenderklicks werden gesammelt geschrieben (journal.py); beim Schließen wird alles Offene geschrieben
+        self.journal = Schreibjournal(self.db, self)
 
-        # Datenbank-Datei im Nutzerordner ablegen
-        datenbank_datei = datenbank_ordner / "rufbereitschaft.db"
+        # Feiertage lokal berechnen und in der DB zwischenspeichern (kein Netzwerk nötig)
+        FeiertageAPI.setze_datenbank(self.db)
 
-        # Verbindung zur DB herstellen
-        self.db = Datenbank(datei=str(datenbank_datei))
+        # Feiertage erst nach dem ersten Zeichnen im Hintergrund vorladen
+        QTimer.singleShot(0, self.feiertage_vorladen)
+
+        # Optionale HTTP-Schnittstelle (eigene lesende Verbindungen), ebenfalls nach dem ersten Zeichnen
+        self.api = None
+        QTimer.singleShot(0, self.api_starten)
 
         # Tab Widget erstellen
-        tabs = QTabWidget()
+        self.tabs = tabs = QTabWidget()
         tabs.setTabPosition(QTabWidget.North)  # North = oben, West = links
         tabs.setMovable(True)                  # Tabs verschiebbar
         tabs.setDocumentMode(True)             # Flacher, moderner Look
         self.setCentralWidget(tabs)
 
-        # Tabs hinzufügen mit Icons
-        tabs.addTab(MitarbeiterWidget(self.db), QIcon("icons/users-solid.svg"), "Mitarbeiter")
-        tabs.addTab(KalenderWidget(self.db), QIcon("icons/calendar-solid.svg"), "Kalender")
-        tabs.addTab(SollIstWidget(self.db), QIcon("icons/chart-bar-solid.svg"), "Soll/Ist Übersicht")
+        # Tabs hinzufügen mit Icons; die Inhalte entstehen erst beim ersten Öffnen
+        tabs.addTab(VerzoegerterTab("Mitarbeiter", lambda: erzeuge_mitarbeiter_tab(self.db)),
+                    QIcon("icons/users-solid.svg"), "Mitarbeiter")
+        tabs.addTab(VerzoegerterTab("Kalender", lambda: erzeuge_kalender_tab(self.db, self.journal)),
+                    QIcon("icons/calendar-solid.svg"), "Kalender")
+        tabs.addTab(VerzoegerterTab("Jahresübersicht", lambda: erzeuge_jahresuebersicht_tab(self.db, self.journal)),
+                    QIcon("icons/calendar-solid.svg"), "Jahresübersicht")
+        tabs.addTab(VerzoegerterTab("Soll/Ist", lambda: erzeuge_soll_ist_tab(self.db)),
+                    QIcon("icons/chart-bar-solid.svg"), "Soll/Ist Übersicht")
+
+        # Versteckter Diagnose-Tab mit den Messwerten (siehe messung.py)
+        self.diagnose_tab = None
+        QShortcut(QKeySequence("Ctrl+Shift+D"), self, self.diagnose_umschalten)
 
         # Styling (kann noch weiter angepasst werden)
         self.setStyleSheet("""
@@ -65,10 +126,66 @@ class MainWindow(QMainWindow):
                 background: #d6d6d6;
             }
         """)
+        StartProfil.markiere("Fenster aufbauen")
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        StartProfil.abschliessen()
+
+    def diagnose_umschalten(self):
+        if self.diagnose_tab is None:
+            self.diagnose_tab = VerzoegerterTab("Diagnose", erzeuge_diagnose_tab)
+            self.tabs.setCurrentIndex(self.tabs.addTab(self.diagnose_tab, "Diagnose"))
+        else:
+            self.tabs.removeTab(self.tabs.indexOf(self.diagnose_tab))
+            self.diagnose_tab.deleteLater()
+            self.diagnose_tab = None
+
+    def closeEvent(self, event):
+        if not self.journal.schreibe():
+            antwort = QMessageBox.question(
+                self, "Nicht gespeichert",
+                "Einige Kalenderänderungen konnten nicht gespeichert werden (Details im Protokoll).\n"
+                "Trotzdem beenden? Die Änderungen gehen dann verloren."
+            )
+            if antwort != QMessageBox.Yes:
+                event.ignore()
+                return
+        # Im Hintergrund oder ohne Schreibzugriff ermittelte Feiertage über die eigene Verbindung sichern
+        FeiertageAPI.speichere_vorgeladene()
+        if self.api is not None:
+            self.api.beende()
+            self.api = None
+        super().closeEvent(event)
+
+    def api_starten(self):
+        # RUFBEREITSCHAFT_API_PORT (siehe api_server.py); das Modul wird nur bei Bedarf importiert
+        port = os.environ.get("RUFBEREITSCHAFT_API_PORT", "").strip()
+        if not port:
+            return
+        from api_server import ApiServer
+        try:
+            self.api = ApiServer(self.db.datei, port=int(port))
+        except Exception:
+            logger.exception("HTTP-Schnittstelle konnte nicht auf Port %s gestartet werden", port)
+            return
+        self.api.starte_im_hintergrund()
+
+    def feiertage_vorladen(self):
+        # Feiertage aller Jahre mit Einträgen (bis nächstes Jahr) im Hintergrund vorladen
+        aktuelles_jahr = date.today().year
+        jahresbereich = self.db.lade_kalender_jahresbereich() or (aktuelles_jahr, aktuelles_jahr)
+        FeiertageAPI.vorladen_im_hintergrund(
+            range(min(jahresbereich[0], aktuelles_jahr - 1), max(jahresbereich[1], aktuelles_jahr + 1) + 1),
+            [FeiertageAPI.LAND_NRW]
+        )
 
 
 if __name__ == "__main__":
+    StartProfil.markiere("Importe")
+    richte_logging_ein(log_ordner=daten_ordner() / "logs", debug=debug_aktiviert(sys.argv))
     app = QApplication(sys.argv)
+    StartProfil.markiere("QApplication")
     window = MainWindow()
     window.show()
     sys.exit(app.exec_())
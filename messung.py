@@ -0,0 +1,134 @@
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# RUFBEREITSCHAFT_MESSUNG=1 misst Datenbankabfragen und Widget-Aktualisierungen (Diagnose-Tab: Strg+Umschalt+D)
+MESSUNG_UMGEBUNGSVARIABLE = "RUFBEREITSCHAFT_MESSUNG"
+
+
+def _eingeschaltet():
+    return os.environ.get(MESSUNG_UMGEBUNGSVARIABLE, "").strip().lower() not in ("", "0", "false", "nein")
+
+
+class Messreihe:
+    __slots__ = ("anzahl", "summe", "maximum", "werte")
+
+    def __init__(self, fenster):
+        self.anzahl = 0
+        self.summe = 0.0
+        self.maximum = 0.0
+        self.werte = deque(maxlen=fenster)  # letzte Dauern in Sekunden für die Perzentile
+
+    def erfasse(self, sekunden):
+        self.anzahl += 1
+        self.summe += sekunden
+        self.maximum = max(self.maximum, sekunden)
+        self.werte.append(sekunden)
+
+    def perzentil(self, sortiert, anteil):
+        # Nächster Rang über die Werte im Fenster
+        return sortiert[min(len(sortiert) - 1, int(anteil * len(sortiert)))]
+
+    def auswertung(self):
+        sortiert = sorted(self.werte)
+        return {
+            "anzahl": self.anzahl,
+            "summe_ms": self.summe * 1000,
+            "p50_ms": self.perzentil(sortiert, 0.50) * 1000,
+            "p90_ms": self.perzentil(sortiert, 0.90) * 1000,
+            "p99_ms": self.perzentil(sortiert, 0.99) * 1000,
+            "max_ms": self.maximum * 1000,
+        }
+
+
+class Messung:
+    # Der Schalter wird einmal beim Import gelesen: ausgeschaltet geben gemessen() und messe_methoden()
+    # die Funktionen unverändert zurück, Zähler werden an der Aufrufstelle über Messung.AKTIV übersprungen.
+    # Erfasst wird aus allen Threads (Soll/Ist rechnet im Thread-Pool).
+    AKTIV = _eingeschaltet()
+    FENSTER = 1000  # Perzentile über die letzten FENSTER Aufrufe je Messpunkt
+
+    _reihen = {}   # Messpunkt -> Messreihe
+    _zaehler = {}  # Name -> Anzahl
+    _beginn = time.time()
+    _sperre = threading.Lock()
+
+    @classmethod
+    def erfasse(cls, messpunkt, sekunden):
+        with cls._sperre:
+            reihe = cls._reihen.get(messpunkt)
+            if reihe is None:
+                reihe = cls._reihen[messpunkt] = Messreihe(cls.FENSTER)
+            reihe.erfasse(sekunden)
+
+    @classmethod
+    def zaehle(cls, name, anzahl=1):
+        with cls._sperre:
+            cls._zaehler[name] = cls._zaehler.get(name, 0) + anzahl
+
+    @classmethod
+    def zuruecksetzen(cls):
+        with cls._sperre:
+            cls._reihen.clear()
+            cls._zaehler.clear()
+            cls._beginn = time.time()
+
+    @classmethod
+    def bericht(cls):
+        with cls._sperre:
+            messpunkte = {name: reihe.auswertung() for name, reihe in sorted(cls._reihen.items())}
+            zaehler = dict(sorted(cls._zaehler.items()))
+            beginn = cls._beginn
+        return {
+            "aktiv": cls.AKTIV,
+            "seit": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(beginn)),
+            "fenster": cls.FENSTER,
+            "messpunkte": messpunkte,
+            "zaehler": zaehler,
+        }
+
+    @classmethod
+    def schreibe_json(cls, datei):
+        with open(datei, "w", encoding="utf-8") as ausgabe:
+            json.dump(cls.bericht(), ausgabe, ensure_ascii=False, indent=2)
+            ausgabe.write("\n")
+        logger.info("Messwerte nach %s geschrieben", datei)
+
+
+def gemessen(messpunkt=None):
+    # Dekorator: Laufzeit jedes Aufrufs unter messpunkt (Standard: Klasse.methode) erfassen
+    def dekorator(funktion):
+        if not Messung.AKTIV:
+            return funktion
+        name = messpunkt or funktion.__qualname__
+
+        @functools.wraps(funktion)
+        def wrapper(*args, **kwargs):
+            beginn = time.perf_counter()
+            try:
+                return funktion(*args, **kwargs)
+            finally:
+                Messung.erfasse(name, time.perf_counter() - beginn)
+        return wrapper
+    return dekorator
+
+
+def messe_methoden(ausnahmen=()):
+    # Klassendekorator: alle öffentlichen Methoden der Klasse messen (ohne Klassen-/statische Methoden)
+    def dekorator(klasse):
+        if not Messung.AKTIV:
+            return klasse
+        for name, wert in list(vars(klasse).items()):
+            if name.startswith("_") or name in ausnahmen or not callable(wert):
+                continue
+            if isinstance(wert, (staticmethod, classmethod, type)):
+                continue
+            setattr(klasse, name, gemessen(f"{klasse.__name__}.{name}")(wert))
+        return klasse
+    return dekorator
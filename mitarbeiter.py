@@ -1,20 +1,114 @@
-import os
-import traceback
-import faulthandler
+import logging
+from datetime import date
 
 from PyQt5.QtWidgets import (
     QWidget, QVBoxLayout, QPushButton, QHBoxLayout,
-    QTableWidget, QTableWidgetItem, QDialog,
+    QTableView, QAbstractItemView, QDialog,
     QLineEdit, QFormLayout, QDialogButtonBox,
-    QColorDialog, QFrame, QDateEdit
+    QColorDialog, QFrame, QDateEdit, QMessageBox
 )
-from PyQt5.QtCore import QDate
+from PyQt5.QtCore import QDate, Qt, QAbstractTableModel, QModelIndex, QSortFilterProxyModel
 from PyQt5.QtGui import QColor
-from PyQt5.QtWidgets import QHeaderView
-
-
-# faulthandler direkt aktivieren (C-Level Tracebacks bei Crash)
 
+from datenbank import KonfliktFehler
+from datensaetze import Mitarbeiter
+from ereignisse import MitarbeiterGeaendert, MitarbeiterGeloescht, MitarbeiterHinzugefuegt
+from messung import gemessen
+
+logger = logging.getLogger(__name__)
+
+
+class MitarbeiterModel(QAbstractTableModel):
+    SPALTEN = ["ID", "Vorname", "Nachname", "Eintritt"]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        # Kompakter Zeilenspeicher: (id, vorname, nachname, eintritt 'YYYY-MM-DD', farbe, version)
+        self.zeilen = []
+        self._farben = {}
+
+    @staticmethod
+    def zeile_aus_mitarbeiter(mitarbeiter):
+        # Eintrittsdatum sicher formatieren
+        eintritt = mitarbeiter.eintritt
+        if hasattr(eintritt, "strftime"):  # datetime.date/datetime
+            eintritt_val = eintritt.strftime("%Y-%m-%d")
+        elif isinstance(eintritt, QDate):
+            eintritt_val = eintritt.toString("yyyy-MM-dd")
+        elif isinstance(eintritt, str):
+            eintritt_val = eintritt.strip()
+        else:
+            eintritt_val = ""
+
+        farbwert = mitarbeiter.farbe
+        farbwert = farbwert.strip() if isinstance(farbwert, str) else ""
+
+        return (
+            mitarbeiter.mitarbeiter_id,
+            mitarbeiter.vorname or "",
+            mitarbeiter.nachname or "",
+            eintritt_val,
+            farbwert,
+            mitarbeiter.version,
+        )
+
+    def mitarbeiter(self, zeile):
+        mid, vorname, nachname, eintritt, farbe, version = self.zeilen[zeile]
+        return Mitarbeiter(mid, vorname, nachname, date.fromisoformat(eintritt) if eintritt else None, farbe, version)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.zeilen)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.SPALTEN)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.SPALTEN[section]
+        return super().headerData(section, orientation, role)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        zeile = self.zeilen[index.row()]
+        if role == Qt.DisplayRole:
+            return zeile[index.column()]
+        if role == Qt.BackgroundRole:
+            return self.farbe(zeile[4])
+        return None
+
+    def farbe(self, farbwert):
+        # QColor je Farbwert nur einmal erzeugen
+        if farbwert not in self._farben:
+            farbe = QColor(farbwert) if farbwert.startswith("#") and len(farbwert) == 7 else QColor()
+            self._farben[farbwert] = farbe if farbe.isValid() else None
+        return self._farben[farbwert]
+
+    def setze_daten(self, mitarbeiter_liste):
+        self.beginResetModel()
+        self.zeilen = [self.zeile_aus_mitarbeiter(m) for m in mitarbeiter_liste]
+        self.endResetModel()
+
+    def zeile_hinzufuegen(self, mitarbeiter):
+        position = len(self.zeilen)
+        self.beginInsertRows(QModelIndex(), position, position)
+        self.zeilen.append(self.zeile_aus_mitarbeiter(mitarbeiter))
+        self.endInsertRows()
+
+    def zeile_aktualisieren(self, zeile, mitarbeiter):
+        self.zeilen[zeile] = self.zeile_aus_mitarbeiter(mitarbeiter)
+        self.dataChanged.emit(self.index(zeile, 0), self.index(zeile, len(self.SPALTEN) - 1))
+
+    def zeile_entfernen(self, zeile):
+        self.beginRemoveRows(QModelIndex(), zeile, zeile)
+        del self.zeilen[zeile]
+        self.endRemoveRows()
+
+    def zeile_fuer_id(self, mitarbeiter_id):
+        for zeile, werte in enumerate(self.zeilen):
+            if werte[0] == mitarbeiter_id:
+                return zeile
+        return -1
 
 
 class MitarbeiterWidget(QWidget):
@@ -39,102 +133,67 @@ class MitarbeiterWidget(QWidget):
 
         self.layout().addLayout(button_layout)
 
-        # Tabelle
-        self.tabelle = QTableWidget()
-        self.tabelle.setColumnCount(4)
-        self.tabelle.setHorizontalHeaderLabels(["ID", "Vorname", "Nachname", "Eintritt"])
+        # Suchfeld (filtert über alle Spalten)
+        self.suche = QLineEdit()
+        self.suche.setPlaceholderText("Suchen...")
+        self.layout().addWidget(self.suche)
+
+        # Tabelle: Model -> Proxy (Sortierung/Filter) -> View
+        self.model = MitarbeiterModel(self)
+        self.proxy = QSortFilterProxyModel(self)
+        self.proxy.setSourceModel(self.model)
+        self.proxy.setFilterCaseSensitivity(Qt.CaseInsensitive)
+        self.proxy.setFilterKeyColumn(-1)
+        self.suche.textChanged.connect(self.proxy.setFilterFixedString)
+
+        self.tabelle = QTableView()
+        self.tabelle.setModel(self.proxy)
+        self.tabelle.setSortingEnabled(True)
+        self.tabelle.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.tabelle.setSelectionMode(QAbstractItemView.SingleSelection)
         self.layout().addWidget(self.tabelle)
 
-        # Mitarbeiter laden
+        # Mitarbeiter laden; Änderungen (auch aus anderen Tabs) kommen als Ereignisse der Datenbank
         self.lade_mitarbeiter()
+        self.db.ereignisse.abonniere(MitarbeiterHinzugefuegt, self.mitarbeiter_hinzugefuegt)
+        self.db.ereignisse.abonniere(MitarbeiterGeaendert, self.mitarbeiter_geaendert)
+        self.db.ereignisse.abonniere(MitarbeiterGeloescht, self.mitarbeiter_geloescht)
 
     def lade_mitarbeiter(self):
-        self.daten = self.db.lade_mitarbeiter()
-        self.aktualisiere_tabelle()
-
-    def aktualisiere_tabelle(self):
-        log_path = os.path.join(os.getcwd(), "debug_mitarbeiter.log")
-        with open(log_path, "a", encoding="utf-8") as log:
-            log.write("=== aktualisiere_tabelle START ===\n")
-            try:
-                self.tabelle.clearContents()
-                self.tabelle.setRowCount(0)
-
-                log.write(f"Anzahl datensätze: {len(self.daten)}\n")
-                for i, mitarbeiter in enumerate(self.daten):
-                    log.write(f"--- Datensatz {i} ---\n")
-                    for k, v in mitarbeiter.items():
-                        try:
-                            log.write(f"  {k} -> repr: {repr(v)} | type: {type(v)}\n")
-                        except Exception:
-                            log.write(f"  {k} -> (could not repr) | type: {type(v)}\n")
-
-                self.tabelle.setRowCount(len(self.daten))
-                for row, mitarbeiter in enumerate(self.daten):
-                    # ID
-                    id_val = ""
-                    try:
-                        id_val = str(mitarbeiter.get("mitarbeiter_id", "") or "")
-                    except Exception as e:
-                        log.write(f"ID conversion error row {row}: {e}\n")
-
-                    # Vorname
-                    vorname_val = mitarbeiter.get("mitarbeiter_vorname") or ""
-
-                    # Nachname
-                    nachname_val = mitarbeiter.get("mitarbeiter_nachname") or ""
-
-                    # Eintrittsdatum sicher formatieren
-                    eintritt = mitarbeiter.get("mitarbeiter_eintritt")
-                    try:
-                        if hasattr(eintritt, "strftime"):  # datetime.date/datetime
-                            eintritt_val = eintritt.strftime("%Y-%m-%d")
-                        elif isinstance(eintritt, QDate):
-                            eintritt_val = eintritt.toString("yyyy-MM-dd")
-                        elif isinstance(eintritt, str):
-                            eintritt_val = eintritt.strip()
-                        else:
-                            eintritt_val = ""
-                    except Exception as e:
-                        eintritt_val = ""
-                        log.write(f"Datum format error row {row}: {e}\n")
-
-                    # Items erstellen (nie None rein)
-                    try:
-                        id_item = QTableWidgetItem(id_val)
-                        vorname_item = QTableWidgetItem(vorname_val)
-                        nachname_item = QTableWidgetItem(nachname_val)
-                        eintritt_item = QTableWidgetItem(eintritt_val)
-                    except Exception as e:
-                        log.write(f"QTableWidgetItem creation error row {row}: {e}\n")
-                        continue
-
-
-                    # Farbe setzen — falls Farbe gültig ist
-                    farbwert = mitarbeiter.get("mitarbeiter_farbe")
-                    if isinstance(farbwert, str):
-
-                        farbwert = farbwert.strip()
-                        if farbwert.startswith("#") and len(farbwert) == 7:
-                            farbe = QColor(farbwert)
-                            if farbe.isValid():
-                                for item in [id_item, vorname_item, nachname_item, eintritt_item]:
-                                    item.setBackground(farbe)
-
-                    # Items in Tabelle setzen
-                    try:
-                        self.tabelle.setItem(row, 0, id_item)
-                        self.tabelle.setItem(row, 1, vorname_item)
-                        self.tabelle.setItem(row, 2, nachname_item)
-                        self.tabelle.setItem(row, 3, eintritt_item)
-                    except Exception as e:
-                        log.write(f"setItem error row {row}: {e}\n")
-
-                log.write("=== aktualisiere_tabelle ENDE erfolgreich ===\n")
-            except Exception as e:
-                log.write("!!! Ausnahme in aktualisiere_tabelle !!!\n")
-                log.write(traceback.format_exc())
-                log.write("=== aktualisiere_tabelle ENDE mit Exception ===\n")
+        self.aktualisiere_tabelle(self.db.lade_mitarbeiter())
+
+    @gemessen()
+    def aktualisiere_tabelle(self, daten):
+        # Ausführlicher Dump nur im Debug-Modus (RUFBEREITSCHAFT_DEBUG=1 bzw. --debug)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("aktualisiere_tabelle: %d Datensätze", len(daten))
+            for i, mitarbeiter in enumerate(daten):
+                logger.debug("Datensatz %d: %r", i, mitarbeiter)
+
+        try:
+            self.model.setze_daten(daten)
+        except Exception:
+            logger.exception("Ausnahme in aktualisiere_tabelle")
+
+    def aktuelle_zeile(self):
+        # Zeilennummer im Model (nicht in der sortierten/gefilterten Ansicht)
+        index = self.tabelle.currentIndex()
+        if not index.isValid():
+            return -1
+        return self.proxy.mapToSource(index).row()
+
+    def mitarbeiter_hinzugefuegt(self, ereignis):
+        self.model.zeile_hinzufuegen(ereignis.mitarbeiter)
+
+    def mitarbeiter_geaendert(self, ereignis):
+        zeile = self.model.zeile_fuer_id(ereignis.mitarbeiter_id)
+        if zeile >= 0:
+            self.model.zeile_aktualisieren(zeile, ereignis.mitarbeiter)
+
+    def mitarbeiter_geloescht(self, ereignis):
+        zeile = self.model.zeile_fuer_id(ereignis.mitarbeiter_id)
+        if zeile >= 0:
+            self.model.zeile_entfernen(zeile)
 
     def hinzufuegen(self):
         dialog = MitarbeiterDialog()
@@ -148,39 +207,45 @@ class MitarbeiterWidget(QWidget):
                     daten["farbe"]
                 )
             except Exception:
-                import traceback
-                traceback.print_exc()
-            self.lade_mitarbeiter()
+                logger.exception("Mitarbeiter konnte nicht hinzugefügt werden")
+                self.lade_mitarbeiter()
 
     def bearbeiten(self):
-        zeile = self.tabelle.currentRow()
+        zeile = self.aktuelle_zeile()
         if zeile < 0:
             return
-        daten_alt = self.daten[zeile]
+        daten_alt = self.model.mitarbeiter(zeile)
 
         dialog = MitarbeiterDialog(daten_alt)
         if dialog.exec_():
             daten = dialog.get_data()
             try:
                 self.db.aktualisiere_mitarbeiter(
-                    daten_alt["mitarbeiter_id"],
+                    daten_alt.mitarbeiter_id,
                     daten["vorname"],
                     daten["nachname"],
                     daten["eintritt"],
-                    daten["farbe"]
+                    daten["farbe"],
+                    version=daten_alt.version
+                )
+            except KonfliktFehler as fehler:
+                # Ein anderer Benutzer war schneller: nichts überschreiben, aktuellen Stand anzeigen
+                logger.info("Konflikt beim Speichern: %s", fehler)
+                QMessageBox.warning(
+                    self, "Konflikt",
+                    "Der Mitarbeiter wurde zwischenzeitlich von einem anderen Benutzer geändert oder gelöscht.\n"
+                    "Die Liste wird neu geladen; bitte die Änderung erneut vornehmen."
                 )
+                self.lade_mitarbeiter()
             except Exception:
-                import traceback
-                traceback.print_exc()
-            self.lade_mitarbeiter()
+                logger.exception("Mitarbeiter %s konnte nicht aktualisiert werden", daten_alt.mitarbeiter_id)
+                self.lade_mitarbeiter()
 
     def loeschen(self):
-        zeile = self.tabelle.currentRow()
+        zeile = self.aktuelle_zeile()
         if zeile < 0:
             return
-        mitarbeiter_id = self.daten[zeile]["mitarbeiter_id"]
-        self.db.loesche_mitarbeiter(mitarbeiter_id)
-        self.lade_mitarbeiter()
+        self.db.loesche_mitarbeiter(self.model.mitarbeiter(zeile).mitarbeiter_id)
 
 
 class MitarbeiterDialog(QDialog):
@@ -214,10 +279,10 @@ class MitarbeiterDialog(QDialog):
         self.layout().addRow("Farbe:", farbe_layout)
 
         if daten:
-            self.vorname.setText(daten.get("mitarbeiter_vorname", ""))
-            self.nachname.setText(daten.get("mitarbeiter_nachname", ""))
-            if daten.get("mitarbeiter_eintritt"):
-                eintritt = daten["mitarbeiter_eintritt"]
+            self.vorname.setText(daten.vorname or "")
+            self.nachname.setText(daten.nachname or "")
+            if daten.eintritt:
+                eintritt = daten.eintritt
                 if isinstance(eintritt, QDate):
                     self.eintritt.setDate(eintritt)
                 elif hasattr(eintritt, "year"):  # datetime.date oder datetime.datetime
@@ -228,9 +293,9 @@ class MitarbeiterDialog(QDialog):
                         self.eintritt.setDate(QDate(y, m, d))
                     except ValueError:
                         pass
-            if "mitarbeiter_farbe" in daten and daten["mitarbeiter_farbe"]:
-                print("Dialog Farbe geladen:", daten["mitarbeiter_farbe"])
-                self.farbe = QColor(daten["mitarbeiter_farbe"])
+            if daten.farbe:
+                logger.debug("Dialog Farbe geladen: %s", daten.farbe)
+                self.farbe = QColor(daten.farbe)
                 self.farbe_preview.setStyleSheet(f"background-color: {self.farbe.name()}; border: 1px solid black;")
 
         buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
@@ -0,0 +1,46 @@
+import logging
+import os
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+
+# RUFBEREITSCHAFT_DEBUG=1 (oder Startparameter --debug) schaltet die ausführliche Protokollierung ein
+DEBUG_UMGEBUNGSVARIABLE = "RUFBEREITSCHAFT_DEBUG"
+LOG_DATEI = "rufbereitschaft.log"
+LOG_MAX_BYTES = 1_000_000
+LOG_BACKUPS = 3
+
+FORMAT = "%(asctime)s %(levelname)-8s %(name)s: %(message)s"
+
+
+def debug_aktiviert(argv=None):
+    if argv is not None and "--debug" in argv:
+        return True
+    return os.environ.get(DEBUG_UMGEBUNGSVARIABLE, "").strip().lower() not in ("", "0", "false", "nein")
+
+
+def richte_logging_ein(log_ordner=None, debug=False):
+    # Einmalige, zentrale Konfiguration: Datei mit Größenbegrenzung im Nutzerordner, Warnungen auch auf stderr
+    wurzel = logging.getLogger()
+    for handler in list(wurzel.handlers):
+        wurzel.removeHandler(handler)
+        handler.close()
+
+    wurzel.setLevel(logging.DEBUG if debug else logging.INFO)
+    formatierer = logging.Formatter(FORMAT)
+
+    if log_ordner is not None:
+        Path(log_ordner).mkdir(parents=True, exist_ok=True)
+        datei_handler = RotatingFileHandler(
+            Path(log_ordner) / LOG_DATEI,
+            maxBytes=LOG_MAX_BYTES,
+            backupCount=LOG_BACKUPS,
+            encoding="utf-8",
+            delay=True,  # Datei erst beim ersten Eintrag öffnen
+        )
+        datei_handler.setFormatter(formatierer)
+        wurzel.addHandler(datei_handler)
+
+    konsolen_handler = logging.StreamHandler()
+    konsolen_handler.setLevel(logging.DEBUG if debug else logging.WARNING)
+    konsolen_handler.setFormatter(formatierer)
+    wurzel.addHandler(konsolen_handler)
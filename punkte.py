@@ -0,0 +1,192 @@
+import threading
+from array import array
+from dataclasses import dataclass
+from datetime import date, datetime
+
+from feiertagsAPI import FeiertageAPI
+
+
+class PunkteKalender:
+    PUNKTE_WERKTAG = 1
+    PUNKTE_WOCHENENDE = 2
+    PUNKTE_FEIERTAG = 3
+
+    _instanzen = {}
+
+    def __init__(self, land=FeiertageAPI.LAND_NRW):
+        self.land = land
+        self._erstes_jahr = None
+        self._letztes_jahr = None
+        self._basis = 0               # Ordinalzahl des 01.01. des ersten Jahres
+        self._punkte = array('B')     # Punkte je Tag
+        self._summen = array('q', [0])  # Präfixsummen: _summen[i] = Summe der ersten i Tage
+        self._stand = None
+        self._db_jahre = {}           # Datenbankdatei -> Jahre, deren Tagespunkte geschrieben sind
+        self._sperre = threading.RLock()  # Soll/Ist wird auch in Hintergrund-Threads berechnet
+
+    @classmethod
+    def fuer_land(cls, land=FeiertageAPI.LAND_NRW):
+        # Gemeinsame Instanz je Land, damit alle Widgets denselben Cache nutzen
+        if land not in cls._instanzen:
+            cls._instanzen[land] = cls(land)
+        return cls._instanzen[land]
+
+    def regeln(self):
+        return self.PUNKTE_WERKTAG, self.PUNKTE_WOCHENENDE, self.PUNKTE_FEIERTAG
+
+    def invalidiere(self):
+        self._erstes_jahr = None
+        self._letztes_jahr = None
+        self._punkte = array('B')
+        self._summen = array('q', [0])
+        self._stand = None
+        self._db_jahre = {}
+
+    def _aktueller_stand(self):
+        # Der Cache ist nur gültig, solange sich weder Feiertage noch Punkteregeln ändern
+        return FeiertageAPI.datenstand(), self.regeln()
+
+    def _sichere_jahre(self, von_jahr, bis_jahr):
+        stand = self._aktueller_stand()
+        if stand != self._stand:
+            self.invalidiere()
+            self._stand = stand
+        elif self._erstes_jahr is not None and self._erstes_jahr <= von_jahr and bis_jahr <= self._letztes_jahr:
+            return
+
+        if self._erstes_jahr is not None:
+            von_jahr = min(von_jahr, self._erstes_jahr)
+            bis_jahr = max(bis_jahr, self._letztes_jahr)
+
+        werktag, wochenende, feiertag = self.regeln()
+        basis = date(von_jahr, 1, 1).toordinal()
+        ende = date(bis_jahr, 12, 31).toordinal()
+
+        feiertage = set()
+        for jahr in range(von_jahr, bis_jahr + 1):
+            feiertage |= FeiertageAPI.feiertags_index(jahr, self.land)
+
+        punkte = array('B')
+        summen = array('q', [0])
+        summe = 0
+        for ordinal in range(basis, ende + 1):
+            if ordinal in feiertage:
+                wert = feiertag
+            elif ordinal % 7 in (6, 0):  # Samstag (6), Sonntag (0) bei date.toordinal()
+                wert = wochenende
+            else:
+                wert = werktag
+            punkte.append(wert)
+            summe += wert
+            summen.append(summe)
+
+        self._erstes_jahr = von_jahr
+        self._letztes_jahr = bis_jahr
+        self._basis = basis
+        self._punkte = punkte
+        self._summen = summen
+
+    def punkte_pro_tag(self, datum):
+        with self._sperre:
+            self._sichere_jahre(datum.year, datum.year)
+            return self._punkte[datum.toordinal() - self._basis]
+
+    def punkte_im_zeitraum(self, start, ende):
+        # Summe der Punkte von start bis ende (jeweils inklusive)
+        if start > ende:
+            return 0
+        with self._sperre:
+            self._sichere_jahre(start.year, ende.year)
+            return self._summen[ende.toordinal() - self._basis + 1] - self._summen[start.toordinal() - self._basis]
+
+    def sichere_tagespunkte(self, datenbank, start, ende):
+        # Schreibt die Punkte der betroffenen Jahre in die Tabelle 'tagespunkte',
+        # damit Ist-Punkte per SQL aggregiert werden können. Geschrieben wird ohne _sperre: das Schreiben kann
+        # bei gesperrter Datenbank lange warten (mit_wiederholung) und darf andere Threads nicht aufhalten.
+        with self._sperre:
+            self._sichere_jahre(start.year, ende.year)
+            geschrieben = self._db_jahre.setdefault(datenbank.datei, set())
+            fehlend = [jahr for jahr in range(start.year, ende.year + 1) if jahr not in geschrieben]
+            if not fehlend:
+                return
+
+            zeilen = []
+            for jahr in fehlend:
+                for ordinal in range(date(jahr, 1, 1).toordinal(), date(jahr, 12, 31).toordinal() + 1):
+                    zeilen.append((date.fromordinal(ordinal), self._punkte[ordinal - self._basis]))
+
+        datenbank.speichere_tagespunkte(zeilen)
+        # Erst nach erfolgreichem Schreiben vermerken; nach invalidiere() trifft das nur noch die alte Menge
+        with self._sperre:
+            geschrieben.update(fehlend)
+
+
+@dataclass
+class SollIstZeile:
+    mitarbeiter_id: int
+    vorname: str
+    nachname: str
+    soll: int
+    ist: int
+
+    @property
+    def differenz(self):
+        return self.ist - self.soll
+
+
+def eintrittsdatum(mitarbeiter):
+    # Die Datenbank liefert den Eintritt als date (oder None); datetime nur aus Dialog-Daten
+    eintritt = mitarbeiter.eintritt
+    if isinstance(eintritt, datetime):
+        return eintritt.date()
+    return eintritt
+
+
+def ist_punkte_aus_eintraegen(datenbank, start, ende, punkte_kalender):
+    # Ist-Punkte ohne Schreibzugriff (für lesende Verbindungen): Einträge im Zeitraum lesen
+    # und die Tagespunkte aus dem Speicher des PunkteKalenders addieren
+    ist_punkte = {}
+    for eintrag in datenbank.iteriere_kalender_eintraege(start, ende):
+        mid = eintrag.mitarbeiter_id
+        ist_punkte[mid] = ist_punkte.get(mid, 0) + punkte_kalender.punkte_pro_tag(eintrag.datum)
+    return ist_punkte
+
+
+def berechne_soll_ist(datenbank, start, ende, punkte_kalender=None, abbruch=None):
+    # Soll/Ist je Mitarbeiter, der bis zum Ende des Zeitraums eingetreten ist (ohne Qt nutzbar).
+    # abbruch: optionales threading.Event; ist es gesetzt, wird None zurückgegeben
+    if punkte_kalender is None:
+        punkte_kalender = PunkteKalender.fuer_land()
+
+    aktive = []
+    for mitarbeiter in datenbank.lade_mitarbeiter():
+        eintritt = eintrittsdatum(mitarbeiter) or start
+        if eintritt <= ende:
+            aktive.append((mitarbeiter, eintritt))
+
+    if not aktive:
+        return []
+
+    if abbruch is not None and abbruch.is_set():
+        return None
+    if datenbank.nur_lesen:
+        ist_punkte = ist_punkte_aus_eintraegen(datenbank, start, ende, punkte_kalender)
+    else:
+        punkte_kalender.sichere_tagespunkte(datenbank, start, ende)
+        ist_punkte = datenbank.lade_ist_punkte_je_mitarbeiter(start, ende)
+    if abbruch is not None and abbruch.is_set():
+        return None
+
+    zeilen = []
+    for mitarbeiter, eintritt in aktive:
+        mid = mitarbeiter.mitarbeiter_id
+        # Individueller Sollzeitraum pro Mitarbeiter: max(Eintritt, Filter-Start) bis Filter-Ende
+        soll = punkte_kalender.punkte_im_zeitraum(max(eintritt, start), ende)
+        zeilen.append(SollIstZeile(
+            mitarbeiter_id=mid,
+            vorname=mitarbeiter.vorname or "",
+            nachname=mitarbeiter.nachname or "",
+            soll=soll,
+            ist=ist_punkte.get(mid, 0),
+        ))
+    return zeilen
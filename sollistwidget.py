@@ -1,18 +1,83 @@
-from datetime import datetime, timedelta
+import logging
+import sqlite3
+import threading
+
 from PyQt5 import Qt
 from PyQt5.QtWidgets import (
     QWidget, QVBoxLayout, QTableWidget, QTableWidgetItem,
-    QHBoxLayout, QLabel, QDateEdit, QPushButton
+    QHBoxLayout, QLabel, QDateEdit, QPushButton, QProgressBar
 )
-from PyQt5.QtCore import QDate
+from PyQt5.QtCore import QDate, QObject, QRunnable, QThreadPool, QTimer, pyqtSignal
 
+from datenbank import Datenbank
+from ereignisse import KalenderEreignis, MitarbeiterEreignis
 from feiertagsAPI import FeiertageAPI
+from messung import gemessen
+from punkte import PunkteKalender, berechne_soll_ist
+
+logger = logging.getLogger(__name__)
+
+
+class SollIstSignale(QObject):
+    fertig = pyqtSignal(int, object)  # auftrag_nr, Liste von SollIstZeile
+    fehler = pyqtSignal(int, str)
+
+
+class SollIstAuftrag(QRunnable):
+    # Berechnet Soll/Ist in einem Thread des QThreadPool mit eigener SQLite-Verbindung
+    def __init__(self, auftrag_nr, datei, start, ende, punkte_kalender, signale):
+        super().__init__()
+        self.auftrag_nr = auftrag_nr
+        self.datei = datei
+        self.start = start
+        self.ende = ende
+        self.punkte_kalender = punkte_kalender
+        self.signale = signale
+        self.abbruch = threading.Event()
+        self._db = None
+        self._sperre = threading.Lock()
+
+    def abbrechen(self):
+        self.abbruch.set()
+        with self._sperre:
+            if self._db is not None:
+                self._db.conn.interrupt()  # laufende Abfrage sofort beenden
+
+    @gemessen()
+    def run(self):
+        if self.abbruch.is_set():
+            return
+        db = None
+        try:
+            # Auch Fehler beim Öffnen (Datei, WAL, Migration, Sperre) müssen als fehler gemeldet werden,
+            # sonst bleibt der Fortschrittsbalken stehen
+            db = Datenbank(datei=self.datei)
+            with self._sperre:
+                self._db = db
+            zeilen = berechne_soll_ist(db, self.start, self.ende, self.punkte_kalender, self.abbruch)
+        except sqlite3.OperationalError as e:
+            if not self.abbruch.is_set():
+                self.signale.fehler.emit(self.auftrag_nr, str(e))
+            return
+        except Exception as e:
+            logger.exception("Fehler bei der Soll/Ist-Berechnung")
+            self.signale.fehler.emit(self.auftrag_nr, str(e))
+            return
+        finally:
+            with self._sperre:
+                self._db = None
+            if db is not None:
+                db.schliesse_verbindung()
+
+        if zeilen is not None and not self.abbruch.is_set():
+            self.signale.fertig.emit(self.auftrag_nr, zeilen)
 
 
 class SollIstWidget(QWidget):
     def __init__(self, datenbank):
         super().__init__()
         self.db = datenbank
+        self.punkte_kalender = PunkteKalender.fuer_land(FeiertageAPI.LAND_NRW)
 
         self.setLayout(QVBoxLayout())
 
@@ -35,156 +100,127 @@ class SollIstWidget(QWidget):
         self.btn_aktualisieren = QPushButton("Aktualisieren")
         filter_layout.addWidget(self.btn_aktualisieren)
 
+        self.fortschritt = QProgressBar()
+        self.fortschritt.setRange(0, 0)  # unbestimmter Fortschritt
+        self.fortschritt.setMaximumWidth(120)
+        self.fortschritt.setTextVisible(False)
+        self.fortschritt.hide()
+        filter_layout.addWidget(self.fortschritt)
+
         self.tabelle = QTableWidget()
         self.layout().addWidget(self.tabelle)
 
-        self.btn_aktualisieren.clicked.connect(self.lade_und_zeige_daten)
-
-        # Daten direkt laden
+        # Berechnung läuft im Hintergrund; nur das Ergebnis des jüngsten Auftrags wird angezeigt
+        self.thread_pool = QThreadPool.globalInstance()
+        self.signale = SollIstSignale(self)
+        self.signale.fertig.connect(self.auftrag_fertig)
+        self.signale.fehler.connect(self.auftrag_fehlgeschlagen)
+        self.auftrag_nr = 0
+        self.laufender_auftrag = None
+
+        # Datumsänderungen kurz sammeln, bevor neu berechnet wird
+        self.verzoegerung = QTimer(self)
+        self.verzoegerung.setSingleShot(True)
+        self.verzoegerung.setInterval(300)
+        self.verzoegerung.timeout.connect(self.lade_und_zeige_daten)
+        self.start_datum.dateChanged.connect(self.verzoegerung.start)
+        self.end_datum.dateChanged.connect(self.verzoegerung.start)
+
+        # Lambda: clicked liefert 'checked', eine gemessene Methode würde es durchreichen
+        self.btn_aktualisieren.clicked.connect(lambda: self.lade_und_zeige_daten())
+
+        # Änderungen an Mitarbeitern oder Einträgen im angezeigten Zeitraum lösen eine Neuberechnung aus;
+        # ist der Tab verdeckt, erst beim nächsten Anzeigen
+        self.veraltet = False
+        self.db.ereignisse.abonniere(MitarbeiterEreignis, self.daten_geaendert)
+        self.db.ereignisse.abonniere(KalenderEreignis, self.daten_geaendert)
+
+        # Daten direkt laden (blockiert den Fensteraufbau nicht)
         self.lade_und_zeige_daten()
 
-    def ist_aktiv_im_zeitraum(self, mitarbeiter, start_dt, end_dt):
-        # Mitarbeiter gilt als aktiv, wenn sein Eintrittsdatum <= Enddatum des Filters
-        eintritt = mitarbeiter.get("mitarbeiter_eintritt")
-        if isinstance(eintritt, str):
-            eintritt = datetime.strptime(eintritt, "%Y-%m-%d").date()
-        elif isinstance(eintritt, datetime):
-            eintritt = eintritt.date()  # datetime -> date
-
-        # Enddatum auf date (falls datetime)
-        if isinstance(end_dt, datetime):
-            end_dt = end_dt.date()
-
-        return eintritt <= end_dt
-
-    def tage_im_zeitraum(self, start_dt, end_dt):
-        # Erzeuge Liste aller Tage im Zeitraum inkl. Enddatum
-        tage = []
-        aktueller_tag = start_dt
-        while aktueller_tag <= end_dt:
-            tage.append(aktueller_tag)
-            aktueller_tag += timedelta(days=1)
-        return tage
-
-    def punkte_pro_tag(self, datum):
-        datum_str = datum.strftime("%Y-%m-%d")
-        tag = datum.weekday()
-        if FeiertageAPI.is_feiertag_in_land(datum_str):
-            return 3
-        elif tag >= 5:  # Samstag (5), Sonntag (6)
-            return 2
-        else:
-            return 1
-
-    def gesamt_soll_punkte_im_zeitraum(self, start_dt, end_dt):
-        tage = self.tage_im_zeitraum(start_dt, end_dt)
-        gesamt = 0
-        for tag in tage:
-            gesamt += self.punkte_pro_tag(tag)
-        return gesamt
-
-    def lade_arbeitstage_je_mitarbeiter_im_zeitraum(self, start_dt, end_dt):
-        query = """
-                SELECT mitarbeiter_id, datum \
-                FROM kalender_mitarbeiter
-                WHERE datum BETWEEN ? AND ? \
-                """
-        self.db.cursor.execute(query, (start_dt.strftime("%Y-%m-%d"), end_dt.strftime("%Y-%m-%d")))
-        ergebnis = self.db.cursor.fetchall()
-
-        arbeitstage = {}
-        for row in ergebnis:
-            mid = row['mitarbeiter_id']
-            datum = row['datum']
-            if not isinstance(datum, str):
-                datum = datum.strftime('%Y-%m-%d')
-            arbeitstage.setdefault(mid, []).append(datum)
-        return arbeitstage
-
-    def punkte_gesamt_je_mitarbeiter(self, arbeitstage):
-        mitarbeiter_punkte = {}
-        for mid, daten in arbeitstage.items():
-            gesamt = 0
-            for datum in daten:
-                gesamt += self.punkte_berechnen(datum)
-            mitarbeiter_punkte[mid] = gesamt
-        return mitarbeiter_punkte
-
-    def punkte_berechnen(self, datum_str):
-        dt = datetime.strptime(datum_str, "%Y-%m-%d")
-        tag = dt.weekday()
-        if FeiertageAPI.is_feiertag_in_land(datum_str):
-            return 3
-        elif tag >= 5:
-            return 2
+    def daten_geaendert(self, ereignis):
+        if isinstance(ereignis, KalenderEreignis):
+            start = self.start_datum.date().toPyDate()
+            ende = self.end_datum.date().toPyDate()
+            if not any(start <= datum <= ende for datum in ereignis.daten):
+                return
+        if self.isVisible():
+            self.verzoegerung.start()
         else:
-            return 1
+            self.veraltet = True
 
-    def lade_und_zeige_daten(self):
-        start_qdate = self.start_datum.date()
-        end_qdate = self.end_datum.date()
-        start_dt = datetime(start_qdate.year(), start_qdate.month(), start_qdate.day()).date()
-        end_dt = datetime(end_qdate.year(), end_qdate.month(), end_qdate.day()).date()
-
-        mitarbeiter_liste = self.db.lade_mitarbeiter()
-
-        aktive_mitarbeiter = []
-        mitarbeiter_soll_punkte = {}
-
-        for mitarbeiter in mitarbeiter_liste:
-            eintritt = mitarbeiter.get("mitarbeiter_eintritt")
-            if isinstance(eintritt, str):
-                eintritt = datetime.strptime(eintritt, "%Y-%m-%d").date()
-            elif isinstance(eintritt, datetime):
-                eintritt = eintritt.date()
+    def showEvent(self, event):
+        super().showEvent(event)
+        if self.veraltet:
+            self.lade_und_zeige_daten()
 
-            # Mitarbeiter nur zählen, wenn Eintritt vor oder gleich Enddatum Filter
-            if eintritt <= end_dt:
-                aktive_mitarbeiter.append(mitarbeiter)
-
-                # Individueller Sollzeitraum pro Mitarbeiter: max(Eintritt, Filter-Start) bis Filter-Ende
-                mitarbeiter_start = max(eintritt, start_dt)
-                mitarbeiter_end = end_dt
-
-                soll = self.gesamt_soll_punkte_im_zeitraum(mitarbeiter_start, mitarbeiter_end)
-                mitarbeiter_soll_punkte[mitarbeiter['mitarbeiter_id']] = soll
+    @gemessen()
+    def lade_und_zeige_daten(self):
+        self.verzoegerung.stop()
+        self.veraltet = False
+        start_dt = self.start_datum.date().toPyDate()
+        end_dt = self.end_datum.date().toPyDate()
+
+        if self.laufender_auftrag is not None:
+            self.laufender_auftrag.abbrechen()
+            self.laufender_auftrag = None
+        self.auftrag_nr += 1
+
+        if self.db.datei == ':memory:':
+            # In-Memory-DBs können nicht von einer zweiten Verbindung gelesen werden
+            self.zeige_daten(berechne_soll_ist(self.db, start_dt, end_dt, self.punkte_kalender))
+            return
 
-        anzahl_aktive = len(aktive_mitarbeiter)
+        # Feiertage und Tagespunkte füllt der Auftrag selbst (eigene Verbindung), der GUI-Thread schreibt nichts
+        self.laufender_auftrag = SollIstAuftrag(
+            self.auftrag_nr, self.db.datei, start_dt, end_dt, self.punkte_kalender, self.signale
+        )
+        self.fortschritt.show()
+        self.thread_pool.start(self.laufender_auftrag)
+
+    def laeuft(self):
+        return self.laufender_auftrag is not None
+
+    def auftrag_fertig(self, auftrag_nr, zeilen):
+        if auftrag_nr != self.auftrag_nr:
+            return  # veraltetes Ergebnis
+        self.laufender_auftrag = None
+        self.fortschritt.hide()
+        self.zeige_daten(zeilen)
+
+    def auftrag_fehlgeschlagen(self, auftrag_nr, meldung):
+        if auftrag_nr != self.auftrag_nr:
+            return
+        self.laufender_auftrag = None
+        self.fortschritt.hide()
+        logger.error("Soll/Ist-Berechnung fehlgeschlagen: %s", meldung)
 
-        if anzahl_aktive == 0:
+    @gemessen()
+    def zeige_daten(self, zeilen):
+        if not zeilen:
             self.tabelle.clear()
             self.tabelle.setRowCount(0)
             self.tabelle.setColumnCount(0)
             return
 
-        arbeitstage = self.lade_arbeitstage_je_mitarbeiter_im_zeitraum(start_dt, end_dt)
-        mitarbeiter_punkte = self.punkte_gesamt_je_mitarbeiter(arbeitstage)
-
         self.tabelle.clear()
         self.tabelle.setColumnCount(6)
         self.tabelle.setHorizontalHeaderLabels([
             "ID", "Vorname", "Nachname", "Soll Punkte", "Ist Punkte", "Differenz"
         ])
-        self.tabelle.setRowCount(anzahl_aktive)
-
-        for row, mitarbeiter in enumerate(aktive_mitarbeiter):
-            mid = mitarbeiter.get("mitarbeiter_id")
-            vorname = mitarbeiter.get("mitarbeiter_vorname", "")
-            nachname = mitarbeiter.get("mitarbeiter_nachname", "")
-
-            soll = mitarbeiter_soll_punkte.get(mid, 0)
-            ist = mitarbeiter_punkte.get(mid, 0)
-            diff = ist - soll
-
-            self.tabelle.setItem(row, 0, QTableWidgetItem(str(mid)))
-            self.tabelle.setItem(row, 1, QTableWidgetItem(vorname))
-            self.tabelle.setItem(row, 2, QTableWidgetItem(nachname))
-            self.tabelle.setItem(row, 3, QTableWidgetItem(f"{soll:.2f}"))
-            self.tabelle.setItem(row, 4, QTableWidgetItem(str(ist)))
+        self.tabelle.setRowCount(len(zeilen))
+
+        for row, zeile in enumerate(zeilen):
+            diff = zeile.differenz
+
+            self.tabelle.setItem(row, 0, QTableWidgetItem(str(zeile.mitarbeiter_id)))
+            self.tabelle.setItem(row, 1, QTableWidgetItem(zeile.vorname))
+            self.tabelle.setItem(row, 2, QTableWidgetItem(zeile.nachname))
+            self.tabelle.setItem(row, 3, QTableWidgetItem(f"{zeile.soll:.2f}"))
+            self.tabelle.setItem(row, 4, QTableWidgetItem(str(zeile.ist)))
             diff_item = QTableWidgetItem(f"{diff:.2f}")
             if diff < 0:
                 diff_item.setForeground(Qt.Qt.red)
             elif diff > 0:
                 diff_item.setForeground(Qt.Qt.darkGreen)
             self.tabelle.setItem(row, 5, diff_item)
-
@@ -0,0 +1,74 @@
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# RUFBEREITSCHAFT_STARTPROFIL=1 gibt nach dem ersten Zeichnen eine Aufschlüsselung der Startzeit aus
+STARTPROFIL_UMGEBUNGSVARIABLE = "RUFBEREITSCHAFT_STARTPROFIL"
+
+
+class StartProfil:
+    # Abschnitte werden nacheinander gemessen: jede Marke zählt die Zeit seit der vorherigen.
+    # Gemessen wird nur im Hauptthread und nur bis der Bericht ausgegeben wurde.
+    _beginn = time.perf_counter()
+    _letzte_marke = _beginn
+    _abschnitte = []  # (name, sekunden)
+    _abgeschlossen = False
+
+    @staticmethod
+    def aktiv():
+        return os.environ.get(STARTPROFIL_UMGEBUNGSVARIABLE, "").strip().lower() not in ("", "0", "false", "nein")
+
+    @classmethod
+    def _misst(cls):
+        return (not cls._abgeschlossen and cls.aktiv()
+                and threading.current_thread() is threading.main_thread())
+
+    @classmethod
+    def markiere(cls, name):
+        if not cls._misst():
+            return
+        jetzt = time.perf_counter()
+        cls._abschnitte.append((name, jetzt - cls._letzte_marke))
+        cls._letzte_marke = jetzt
+
+    @classmethod
+    @contextmanager
+    def abschnitt(cls, name):
+        # Zeit bis zum Beginn des Abschnitts wird als "sonstiges" verbucht, damit die Summe stimmt
+        if not cls._misst():
+            yield
+            return
+        cls.markiere("sonstiges")
+        try:
+            yield
+        finally:
+            cls.markiere(name)
+
+    @classmethod
+    def bericht(cls):
+        gesamt = cls._letzte_marke - cls._beginn
+        zeilen = [f"Startzeit bis zum ersten Zeichnen: {gesamt * 1000:.0f} ms"]
+        for name, dauer in cls._abschnitte:
+            if name == "sonstiges" and dauer < 0.0005:
+                continue
+            anteil = dauer / gesamt * 100 if gesamt else 0
+            zeilen.append(f"  {name:<30} {dauer * 1000:>8.1f} ms {anteil:>5.1f} %")
+        return "\n".join(zeilen)
+
+    @classmethod
+    def abschliessen(cls, name="Erstes Zeichnen"):
+        # Einmalig nach dem ersten Zeichnen aufrufen; gibt den Bericht aus, falls eingeschaltet
+        if not cls._misst():
+            cls._abgeschlossen = True
+            return
+        cls.markiere(name)
+        cls._abgeschlossen = True
+        text = cls.bericht()
+        logger.info(text)
+        if sys.stderr is not None:  # None im gepackten Build ohne Konsole (PyInstaller console=False)
+            sys.stderr.write(text + "\n")
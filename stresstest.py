@@ -0,0 +1,172 @@
+"""Mehrbenutzer-Stresstest: mehrere Prozesse schreiben gleichzeitig in dieselbe Datenbankdatei.
+
+Jeder Prozess trägt eigene Kalendertage ein und löscht einen Teil davon wieder, schreibt Zeiträume
+in Sammeltransaktionen und erhöht einen gemeinsamen Zähler (Nachname eines gemeinsamen Mitarbeiters)
+über optimistische Sperren. Anschließend wird geprüft, dass keine Sperrfehler durchgeschlagen sind,
+keine Änderung verloren ging und die Monatssummen zu den Rohdaten passen.
+
+Beispiele:
+    python stresstest.py
+    python stresstest.py --prozesse 8 --operationen 500 --datei /tmp/stress.db --ueberschreiben
+"""
+import argparse
+import multiprocessing
+import random
+import sys
+import tempfile
+import time
+import traceback
+from datetime import date, timedelta
+from pathlib import Path
+
+from datenbank import Datenbank, KonfliktFehler
+
+JAHR = 2024
+
+
+def zaehler_erhoehen(db, zaehler_id):
+    # Lesen, ändern, mit erwarteter Version zurückschreiben; bei Konflikt neu lesen
+    konflikte = 0
+    while True:
+        vorname, nachname, eintritt, farbe, version = db.conn.execute(
+            "SELECT mitarbeiter_vorname, mitarbeiter_nachname, mitarbeiter_eintritt, mitarbeiter_farbe, version "
+            "FROM mitarbeiter WHERE mitarbeiter_id = ?", (zaehler_id,)
+        ).fetchone()
+        try:
+            db.aktualisiere_mitarbeiter(zaehler_id, vorname, str(int(nachname) + 1), eintritt, farbe, version=version)
+            return konflikte
+        except KonfliktFehler:
+            konflikte += 1
+
+
+def arbeiter(nummer, datei, mitarbeiter_id, zaehler_id, operationen, start_signal, ergebnisse):
+    random.seed(nummer)
+    statistik = {"nummer": nummer, "erhoehungen": 0, "konflikte": 0, "fehler": [], "tage": set()}
+    try:
+        db = Datenbank(datei=datei)
+        start_signal.wait()
+        beginn = time.perf_counter()
+        for _ in range(operationen):
+            wahl = random.random()
+            if wahl < 0.4:
+                statistik["konflikte"] += zaehler_erhoehen(db, zaehler_id)
+                statistik["erhoehungen"] += 1
+            elif wahl < 0.75:
+                tag = date(JAHR, 1, 1) + timedelta(days=random.randrange(366))
+                if tag not in statistik["tage"]:
+                    db.fuege_kalender_eintrag_hinzu(tag, mitarbeiter_id)
+                    statistik["tage"].add(tag)
+            elif wahl < 0.85 and statistik["tage"]:
+                tag = random.choice(sorted(statistik["tage"]))
+                eintrag = next(e for e in db.lade_kalender_eintraege(tag) if e.mitarbeiter_id == mitarbeiter_id)
+                db.loesche_kalender_eintrag(eintrag.id)
+                statistik["tage"].discard(tag)
+            elif wahl < 0.9:
+                start = date(JAHR, 1, 1) + timedelta(days=random.randrange(360))
+                ende = start + timedelta(days=random.randrange(7))
+                db.weise_zeitraum_zu(mitarbeiter_id, start, ende)
+                statistik["tage"].update(start + timedelta(days=i) for i in range((ende - start).days + 1))
+            else:
+                db.lade_ist_punkte_je_mitarbeiter(date(JAHR, 1, 1), date(JAHR, 12, 31))
+        statistik["sekunden"] = time.perf_counter() - beginn
+        db.schliesse_verbindung()
+    except Exception:
+        statistik["fehler"].append(traceback.format_exc())
+    ergebnisse.put(statistik)
+
+
+def bereite_vor(datei, prozesse):
+    for endung in ("", "-wal", "-shm", "-journal"):
+        Path(f"{datei}{endung}").unlink(missing_ok=True)
+    db = Datenbank(datei=datei)
+    with db.transaktion():
+        zaehler_id = db.fuege_mitarbeiter_hinzu("Zähler", "0", date(JAHR, 1, 1), "#ffffff")
+        ids = [db.fuege_mitarbeiter_hinzu(f"Vorname{i}", f"Nachname{i}", date(JAHR, 1, 1), "#ffffff")
+               for i in range(prozesse)]
+    db.schliesse_verbindung()
+    return zaehler_id, ids
+
+
+def pruefe(datei, zaehler_id, ids, statistiken):
+    probleme = []
+    for statistik in statistiken:
+        for fehler in statistik["fehler"]:
+            probleme.append(f"Prozess {statistik['nummer']}:\n{fehler}")
+
+    db = Datenbank(datei=datei)
+    zaehler = int(db.conn.execute(
+        "SELECT mitarbeiter_nachname FROM mitarbeiter WHERE mitarbeiter_id = ?", (zaehler_id,)).fetchone()[0])
+    erwartet = sum(statistik["erhoehungen"] for statistik in statistiken)
+    if zaehler != erwartet:
+        probleme.append(f"Zähler {zaehler}, erwartet {erwartet} (verlorene Aktualisierungen)")
+
+    for statistik in statistiken:
+        mitarbeiter_id = ids[statistik["nummer"]]
+        tage = {eintrag.datum for eintrag in db.iteriere_kalender_eintraege(date(JAHR, 1, 1), date(JAHR, 12, 31))
+                if eintrag.mitarbeiter_id == mitarbeiter_id}
+        if tage != statistik["tage"]:
+            probleme.append(f"Prozess {statistik['nummer']}: {len(tage)} Tage gespeichert, "
+                            f"{len(statistik['tage'])} erwartet")
+
+    monatssummen = "SELECT * FROM punkte_monat ORDER BY mitarbeiter_id, monat"
+    vorher = db.conn.execute(monatssummen).fetchall()
+    db.baue_punkte_monat_neu()
+    if db.conn.execute(monatssummen).fetchall() != vorher:
+        probleme.append("Monatssummen weichen von den Rohdaten ab")
+
+    integritaet = db.conn.execute("PRAGMA integrity_check").fetchone()[0]
+    if integritaet != "ok":
+        probleme.append(f"integrity_check: {integritaet}")
+    db.schliesse_verbindung()
+    return probleme
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mehrbenutzer-Stresstest der Rufbereitschaft-Datenbank")
+    parser.add_argument("--prozesse", type=int, default=6)
+    parser.add_argument("--operationen", type=int, default=300, help="Operationen je Prozess")
+    parser.add_argument("--datei", help="Datenbankdatei (Standard: temporäres Verzeichnis)")
+    parser.add_argument("--ueberschreiben", action="store_true",
+                        help="Vorhandene Datei unter --datei ersetzen (wird gelöscht!)")
+    args = parser.parse_args(argv)
+    if args.datei and Path(args.datei).exists() and not args.ueberschreiben:
+        parser.error(f"{args.datei} existiert bereits; zum Ersetzen --ueberschreiben angeben")
+
+    with tempfile.TemporaryDirectory() as ordner:
+        datei = args.datei or str(Path(ordner) / "stresstest.db")
+        zaehler_id, ids = bereite_vor(datei, args.prozesse)
+
+        kontext = multiprocessing.get_context("spawn")
+        start_signal = kontext.Event()
+        ergebnisse = kontext.Queue()
+        prozesse = [
+            kontext.Process(target=arbeiter, args=(
+                nummer, datei, ids[nummer], zaehler_id, args.operationen, start_signal, ergebnisse))
+            for nummer in range(args.prozesse)
+        ]
+        for prozess in prozesse:
+            prozess.start()
+        beginn = time.perf_counter()
+        start_signal.set()
+        statistiken = [ergebnisse.get() for _ in prozesse]
+        for prozess in prozesse:
+            prozess.join()
+        dauer = time.perf_counter() - beginn
+
+        statistiken.sort(key=lambda statistik: statistik["nummer"])
+        for statistik in statistiken:
+            print(f"Prozess {statistik['nummer']}: {statistik['erhoehungen']} Erhöhungen, "
+                  f"{statistik['konflikte']} Konflikte, {len(statistik['tage'])} Tage, "
+                  f"{statistik.get('sekunden', 0):.2f} s")
+        gesamt = args.prozesse * args.operationen
+        print(f"{gesamt} Operationen in {dauer:.2f} s ({gesamt / dauer:.0f}/s)")
+
+        probleme = pruefe(datei, zaehler_id, ids, statistiken)
+    for problem in probleme:
+        print(f"FEHLER: {problem}", file=sys.stderr)
+    print("OK" if not probleme else f"{len(probleme)} Problem(e)")
+    return 1 if probleme else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
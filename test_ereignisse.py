@@ -0,0 +1,55 @@
+import unittest
+from datetime import date, datetime
+
+from datenbank import Datenbank
+from ereignisse import EintraegeEntfernt, EintraegeGeaendert, EintraegeHinzugefuegt, KalenderEreignis
+
+
+class KalenderEreignisDatenTest(unittest.TestCase):
+    # Abonnenten vergleichen und rechnen mit datetime.date; ISO-Text der Aufrufer darf nicht durchsickern
+
+    def setUp(self):
+        self.db = Datenbank(datei=":memory:")
+        self.mid = self.db.fuege_mitarbeiter_hinzu("Anna", "Berg", date(2024, 1, 1), "#ff0000")
+        self.ereignisse = []
+        self.db.ereignisse.abonniere(KalenderEreignis, self.empfange)
+
+    def empfange(self, ereignis):
+        self.ereignisse.append(ereignis)
+
+    def tearDown(self):
+        self.db.schliesse_verbindung()
+
+    def assertNurDatum(self, ereignis_typ, erwartet):
+        ereignis = self.ereignisse[-1]
+        self.assertIsInstance(ereignis, ereignis_typ)
+        self.assertTrue(all(type(datum) is date for datum in ereignis.daten), ereignis.daten)
+        self.assertEqual(ereignis.daten, frozenset(erwartet))
+
+    def test_einzelner_eintrag_als_text(self):
+        eintrag_id = self.db.fuege_kalender_eintrag_hinzu("2025-07-05", self.mid)
+        self.assertNurDatum(EintraegeHinzugefuegt, [date(2025, 7, 5)])
+
+        self.db.aktualisiere_kalender_eintrag(eintrag_id, "2025-07-06", self.mid)
+        self.assertNurDatum(EintraegeGeaendert, [date(2025, 7, 5), date(2025, 7, 6)])
+
+        self.db.loesche_kalender_eintrag(eintrag_id)
+        self.assertNurDatum(EintraegeEntfernt, [date(2025, 7, 6)])
+
+    def test_mehrere_eintraege_als_text_und_datetime(self):
+        self.db.fuege_kalender_eintraege_hinzu([("2025-07-01", self.mid), (datetime(2025, 7, 2, 8, 30), self.mid)])
+        self.assertNurDatum(EintraegeHinzugefuegt, [date(2025, 7, 1), date(2025, 7, 2)])
+
+        self.db.loesche_kalender_eintraege_im_zeitraum("2025-07-01", "2025-07-31")
+        self.assertNurDatum(EintraegeEntfernt, [date(2025, 7, 1), date(2025, 7, 2)])
+
+    def test_gesammelte_aenderungen_als_text(self):
+        self.db.wende_kalender_aenderungen_an([("2025-08-01", self.mid)], [])
+        self.assertNurDatum(EintraegeHinzugefuegt, [date(2025, 8, 1)])
+
+        self.db.wende_kalender_aenderungen_an([], [("2025-08-01", self.mid)])
+        self.assertNurDatum(EintraegeEntfernt, [date(2025, 8, 1)])
+
+
+if __name__ == "__main__":
+    unittest.main()